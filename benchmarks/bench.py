@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+"""
+Throughput benchmarks for pywandio readers and writers.
+
+Generates a synthetic line-oriented dataset, then reads it with every
+combination of encoding (plain, gzip, bzip2), transport (local file, stdin,
+HTTP from a local http.server) and read mode (readline, next and
+copyfileobj, as offered by pywandio-cat), and writes it with every encoding.
+Each case runs in its own process, so that peak RSS is measured per case.
+Results are written as JSON:
+
+    python benchmarks/bench.py --size 64 --output results.json
+    python benchmarks/bench.py --compare old.json results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+import wandio
+import wandio.opener
+
+ENCODINGS = {
+    "plain": ".txt",
+    "gzip": ".txt.gz",
+    "bzip2": ".txt.bz2",
+}
+TRANSPORTS = ["local", "stdin", "http"]
+READ_MODES = ["readline", "next", "copyfileobj"]
+
+WORDS = ["AS%d" % i for i in range(1000)] + ["|", "-1", "0", "1", "bgp"]
+
+
+class QuietRequestHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class CountingSink(object):
+    """
+    Output file that discards what is written to it
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+
+
+def generate(directory, size_mb, seed=0):
+    """
+    Write the dataset (about size_mb MiB of text) in each encoding
+    """
+    rng = random.Random(seed)
+    path = os.path.join(directory, "data" + ENCODINGS["plain"])
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, "w") as fh:
+        while written < target:
+            lines = []
+            for _ in range(1000):
+                lines.append(" ".join(rng.choice(WORDS)
+                                      for _ in range(rng.randint(1, 30))))
+            block = "\n".join(lines) + "\n"
+            fh.write(block)
+            written += len(block)
+    for (encoding, suffix) in ENCODINGS.items():
+        if encoding == "plain":
+            continue
+        with open(path, "rb") as src:
+            with wandio.open(os.path.join(directory, "data" + suffix),
+                             "w") as dst:
+                dst.write(src.read())
+    return path
+
+
+def read_case(filename, mode):
+    """
+    Read the file using the given mode, returning the number of lines (or
+    None when copying data) and bytes
+    """
+    lines = 0
+    nbytes = 0
+    with wandio.open(filename, "rb" if mode == "copyfileobj" else "r") as fh:
+        if mode == "readline":
+            line = fh.readline()
+            while line:
+                lines += 1
+                nbytes += len(line)
+                line = fh.readline()
+        elif mode == "next":
+            for line in fh:
+                lines += 1
+                nbytes += len(line)
+        else:
+            out = CountingSink()
+            wandio.opener.copyfileobj(fh, out)
+            nbytes = out.count
+            lines = None
+    return lines, nbytes
+
+
+def write_case(src, filename):
+    lines = 0
+    nbytes = 0
+    with open(src) as fh:
+        with wandio.open(filename, "w") as out:
+            for line in fh:
+                out.write(line)
+                lines += 1
+                nbytes += len(line)
+    os.unlink(filename)
+    return lines, nbytes
+
+
+def run_case(case):
+    """
+    Run a single case in this process, and return its measurements
+    """
+    if case["op"] == "read":
+        func = read_case
+        args = (case["file"], case["mode"])
+    else:
+        func = write_case
+        args = (case["src"], case["file"])
+    if case.get("trace"):
+        tracemalloc.start()
+    start = time.time()
+    (lines, nbytes) = func(*args)
+    elapsed = time.time() - start
+    result = {
+        "seconds": elapsed,
+        "bytes": nbytes,
+        "lines": lines,
+        "mb_per_s": nbytes / elapsed / 1e6,
+        "lines_per_s": lines / elapsed if lines is not None else None,
+    }
+    if case.get("trace"):
+        (_, peak) = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().statistics("filename")
+        tracemalloc.stop()
+        result = {
+            "alloc_peak_bytes": peak,
+            "alloc_blocks": sum(stat.count for stat in stats),
+        }
+    else:
+        # ru_maxrss is in KiB on Linux, but in bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != "darwin":
+            rss *= 1024
+        result["peak_rss_bytes"] = rss
+    return result
+
+
+def spawn_case(case, stdin_file=None):
+    """
+    Run a case in a new process
+    """
+    stdin = open(stdin_file, "rb") if stdin_file else None
+    try:
+        out = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), "--run-case",
+             json.dumps(case)], stdin=stdin)
+    finally:
+        if stdin is not None:
+            stdin.close()
+    return json.loads(out.decode("utf-8"))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.STDOUT).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(opts):
+    directory = tempfile.mkdtemp(prefix="wandio-bench-")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), QuietRequestHandler)
+    # serve the dataset directory (the handler serves the working directory)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    base_url = "http://127.0.0.1:%d/" % server.server_address[1]
+
+    results = []
+    try:
+        src = generate(directory, opts["size"])
+        for (encoding, suffix) in sorted(ENCODINGS.items()):
+            if opts["encodings"] and encoding not in opts["encodings"]:
+                continue
+            path = os.path.join(directory, "data" + suffix)
+            for transport in TRANSPORTS:
+                if opts["transports"] and transport not in opts["transports"]:
+                    continue
+                filename = {"local": path, "stdin": "-",
+                            "http": base_url + "data" + suffix}[transport]
+                for mode in READ_MODES:
+                    case = {"op": "read", "encoding": encoding,
+                            "transport": transport, "mode": mode,
+                            "file": filename}
+                    results.append(_measure(case, opts, stdin_file=path
+                                            if transport == "stdin" else None))
+            case = {"op": "write", "encoding": encoding, "transport": "local",
+                    "mode": "write", "src": src,
+                    "file": os.path.join(directory, "out" + suffix)}
+            results.append(_measure(case, opts))
+    finally:
+        server.shutdown()
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+
+    return {
+        "revision": git_revision(),
+        "time": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "size_mb": opts["size"],
+        "repeat": opts["repeat"],
+        "results": results,
+    }
+
+
+def _measure(case, opts, stdin_file=None):
+    runs = [spawn_case(case, stdin_file) for _ in range(opts["repeat"])]
+    # report the fastest run, which is the least disturbed by other load
+    result = dict(min(runs, key=lambda run: run["seconds"]))
+    if opts["alloc"]:
+        result.update(spawn_case(dict(case, trace=True), stdin_file))
+    result.update(dict((key, case[key]) for key in
+                       ["op", "encoding", "transport", "mode"]))
+    sys.stderr.write("%-5s %-6s %-6s %-11s %8.1f MB/s\n" %
+                     (case["op"], case["encoding"], case["transport"],
+                      case["mode"], result["mb_per_s"]))
+    return result
+
+
+def _key(result):
+    return (result["op"], result["encoding"], result["transport"],
+            result["mode"])
+
+
+def compare(old_file, new_file):
+    with open(old_file) as fh:
+        old = dict((_key(r), r) for r in json.load(fh)["results"])
+    with open(new_file) as fh:
+        new = json.load(fh)["results"]
+    print("%-5s %-6s %-6s %-11s %10s %10s %8s" %
+          ("op", "codec", "via", "mode", "old MB/s", "new MB/s", "change"))
+    for result in new:
+        before = old.get(_key(result))
+        if before is None:
+            continue
+        change = result["mb_per_s"] / before["mb_per_s"] - 1
+        print("%-5s %-6s %-6s %-11s %10.1f %10.1f %+7.1f%%" %
+              (_key(result) + (before["mb_per_s"], result["mb_per_s"],
+                               change * 100)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="""
+    Measures the throughput of pywandio readers and writers
+    """)
+
+    parser.add_argument('-s', '--size', required=False,
+                        type=int, default=32,
+                        help="Size of the dataset in MiB")
+
+    parser.add_argument('-r', '--repeat', required=False,
+                        type=int, default=3,
+                        help="Number of times to run each case")
+
+    parser.add_argument('-o', '--output', required=False,
+                        help="File to write the results to (as JSON)")
+
+    parser.add_argument('-e', '--encodings', required=False, nargs='+',
+                        choices=sorted(ENCODINGS),
+                        help="Only benchmark these encodings")
+
+    parser.add_argument('-t', '--transports', required=False, nargs='+',
+                        choices=TRANSPORTS,
+                        help="Only benchmark these transports")
+
+    parser.add_argument('-a', '--alloc', required=False,
+                        action='store_true',
+                        help="Also measure allocations (with tracemalloc)")
+
+    parser.add_argument('--compare', required=False, nargs=2,
+                        metavar=('OLD', 'NEW'),
+                        help="Compare two result files")
+
+    parser.add_argument('--run-case', required=False,
+                        help=argparse.SUPPRESS)
+
+    opts = vars(parser.parse_args())
+
+    if opts["run_case"]:
+        print(json.dumps(run_case(json.loads(opts["run_case"]))))
+    elif opts["compare"]:
+        compare(*opts["compare"])
+    else:
+        results = run_all(opts)
+        if opts["output"]:
+            with open(opts["output"], "w") as fh:
+                json.dump(results, fh, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,11 +10,16 @@ setuptools.setup(
     author='Alistair King, Chiara Orsini, Mingwei Zhang',
     author_email='software@caida.org',
     packages=setuptools.find_packages(),
+    python_requires='>=3.7',
     install_requires=[
         'python-dotenv',
         'python-keystoneclient',
         'python-swiftclient',
     ],
+    extras_require={
+        'zstd': ['zstandard'],
+        'lz4': ['lz4'],
+    },
     entry_points={'console_scripts': [
         'pywandio-cat = wandio.opener:read_main',
         'pywandio-write = wandio.opener:write_main',
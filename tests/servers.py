@@ -0,0 +1,174 @@
+"""
+Stand-in HTTP servers for the tests, which serve on a free port of the
+loopback interface from a background thread
+"""
+import collections
+import contextlib
+import itertools
+import json
+import os
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer, \
+    SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """
+    Serves the files in the current directory, without logging requests
+    """
+
+    def log_message(self, *args):
+        pass
+
+
+class RangeRequestHandler(QuietHandler):
+    """
+    Also supports single "Range: bytes=START-END" requests
+    """
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            return QuietHandler.send_head(self)
+        with open(path, "rb") as f:
+            data = f.read()
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2) or len(data) - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" %
+                             (start, end, len(data)))
+            data = data[start:end + 1]
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command == "GET":
+            self.wfile.write(data)
+        return None
+
+
+class SwiftRequestHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for a Swift proxy that keeps objects in memory and supports
+    container PUTs, object PUTs, HEADs and (ranged) GETs, including for DLO
+    manifests. It also stands in for v1 auth (at /auth/v1.0, counting the
+    auths for each user), and for Keystone's token lookup (at
+    /v3/auth/tokens). Requests need one of valid_tokens.
+    """
+
+    protocol_version = "HTTP/1.1"
+    objects = {}
+    manifests = {}
+    valid_tokens = set(["test"])
+    # lifetime of the tokens handed out, in seconds
+    token_lifetime = 3600
+    auths = collections.Counter()
+    token_ids = itertools.count()
+
+    def _authorized(self):
+        return self.headers.get("X-Auth-Token") in self.valid_tokens
+
+    def _auth(self):
+        user = self.headers.get("X-Auth-User")
+        token = "%s-%d" % (user, next(self.token_ids))
+        self.auths[user] += 1
+        self.valid_tokens.add(token)
+        self.send_response(200)
+        self.send_header("X-Storage-Url", "http://%s:%d/v1/AUTH_test" %
+                         self.server.server_address)
+        self.send_header("X-Auth-Token", token)
+        self.send_header("X-Auth-Token-Expires", str(self.token_lifetime))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _token_info(self):
+        if self.headers.get("X-Subject-Token") not in self.valid_tokens:
+            return self._respond(404)
+        expires = time.gmtime(time.time() + self.token_lifetime)
+        self._respond(200, json.dumps({"token": {
+            "expires_at": time.strftime("%Y-%m-%dT%H:%M:%S.000000Z", expires)
+        }}).encode("utf-8"))
+
+    def _path(self):
+        # /v1/AUTH_test/CONTAINER[/OBJECT]
+        return unquote(self.path).split("/", 3)[3]
+
+    def _respond(self, status, body=b"", send_body=True):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _object(self, path):
+        if path in self.manifests:
+            prefix = self.manifests[path]
+            return b"".join(self.objects[name] for name in
+                            sorted(self.objects) if name.startswith(prefix))
+        return self.objects.get(path)
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self._authorized():
+            return self._respond(401)
+        path = self._path()
+        if "/" in path:
+            self.objects[path] = body
+            if "X-Object-Manifest" in self.headers:
+                self.manifests[path] = unquote(
+                    self.headers["X-Object-Manifest"])
+        self._respond(201)
+
+    def do_HEAD(self):
+        if not self._authorized():
+            return self._respond(401, send_body=False)
+        body = self._object(self._path())
+        if body is None:
+            return self._respond(404, send_body=False)
+        self._respond(200, body, send_body=False)
+
+    def do_GET(self):
+        if self.path == "/auth/v1.0":
+            return self._auth()
+        if self.path == "/v3/auth/tokens":
+            return self._token_info()
+        if not self._authorized():
+            return self._respond(401)
+        body = self._object(self._path())
+        if body is None:
+            return self._respond(404)
+        match = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        if match:
+            body = body[int(match.group(1)):int(match.group(2)) + 1]
+            return self._respond(206, body)
+        self._respond(200, body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serving(handler, threaded=False):
+    """
+    Run an HTTP server for the duration of a with block
+    :param handler: request handler class
+    :param threaded: whether to handle each connection in its own thread
+    :return: the server's base URL ("http://127.0.0.1:PORT")
+    """
+    cls = ThreadingHTTPServer if threaded else HTTPServer
+    server = cls(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield "http://127.0.0.1:%d" % server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,30 @@
+import asyncio
+import wandio.aio
+
+import servers
+
+
+async def count(filename):
+    line_count = 0
+    word_count = 0
+    async with wandio.aio.open(filename) as fh:
+        async for line in fh:
+            word_count += len(line.rstrip().split())
+            line_count +=1
+    return line_count, word_count
+
+
+async def count_all(filenames):
+    return await asyncio.gather(*[count(filename) for filename in filenames])
+
+
+if __name__ == '__main__':
+
+    with servers.serving(servers.QuietHandler) as base:
+        url = base + "/test.txt.gz"
+
+        # read the local file and several copies over HTTP at the same time
+        files = ["test.txt.gz"] + [url] * 4
+        counts = asyncio.run(count_all(files))
+        assert len(set(counts)) == 1
+        print(*counts[0])
@@ -0,0 +1,44 @@
+import shutil
+import tempfile
+import wandio
+import wandio.cache
+
+import servers
+
+
+class CountingRequestHandler(servers.QuietHandler):
+    """
+    Counts the GET requests made (HEAD requests are used to validate cached
+    copies)
+    """
+
+    gets = 0
+
+    def do_GET(self):
+        CountingRequestHandler.gets += 1
+        servers.QuietHandler.do_GET(self)
+
+
+if __name__ == '__main__':
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        with servers.serving(CountingRequestHandler) as base:
+            url = base + "/test.txt.gz"
+            cache = wandio.cache.DiskCache(cache_dir)
+            counts = []
+            # the first read downloads the file, and the others use the
+            # cached copy
+            for _ in range(3):
+                with wandio.open(url, cache=cache) as fh:
+                    line_count = 0
+                    word_count = 0
+                    for line in fh:
+                        word_count += len(line.rstrip().split())
+                        line_count +=1
+                    counts.append((line_count, word_count))
+            assert CountingRequestHandler.gets == 1
+            assert len(set(counts)) == 1
+            print(line_count, word_count)
+    finally:
+        shutil.rmtree(cache_dir)
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import wandio
+
+import servers
+
+# an index page like the ones Apache generates, with links to sort the
+# listing, to the parent directory and to another site
+INDEX = b"""<html><body><h1>Index of /data</h1>
+<a href="?C=N;O=D">Name</a> <a href="?C=M;O=A">Last modified</a>
+<a href="/">Parent Directory</a>
+<a href="../">Up</a>
+<a href="a.gz">a.gz</a>
+<a href="b.txt">b.txt</a>
+<a href="/data/c.gz">c.gz</a>
+<a href="sub/">sub/</a>
+<a href="http://example.com/d.gz">elsewhere</a>
+<a href="a.gz#top">a.gz again</a>
+</body></html>"""
+
+SUB_INDEX = b"""<html><body>
+<a href="../">Parent Directory</a>
+<a href="e.gz">e.gz</a>
+</body></html>"""
+
+
+class IndexHandler(servers.QuietHandler):
+
+    def do_GET(self):
+        body = {"/data/": INDEX, "/data/sub/": SUB_INDEX}.get(self.path)
+        self.send_response(200 if body is not None else 404)
+        body = body or b""
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200 if self.path.endswith(".gz") else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+if __name__ == '__main__':
+
+    with servers.serving(IndexHandler) as base:
+        base += "/data"
+
+        entries = list(wandio.listdir(base, details=True))
+        assert [(e["name"], e["is_dir"]) for e in entries] == [
+            (base + "/a.gz", False),
+            (base + "/b.txt", False),
+            (base + "/c.gz", False),
+            (base + "/sub", True),
+        ], entries
+        assert list(wandio.glob(base + "/*.gz")) == [base + "/a.gz",
+                                                      base + "/c.gz"]
+        assert list(wandio.glob(base + "/*/*.gz")) == [base + "/sub/e.gz"]
+        # patterns without wildcards are stat'ed
+        assert list(wandio.glob(base + "/sub/e.gz")) == [base + "/sub/e.gz"]
+        assert list(wandio.glob(base + "/sub/f.txt")) == []
+
+    # local directories
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for name in ["x.gz", "y.gz", "z.txt", ".hidden.gz", "sub/w.gz"]:
+            path = os.path.join(tmpdir, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "w") as fh:
+                fh.write("data\n")
+        names = [os.path.join(tmpdir, name) for name in
+                 [".hidden.gz", "sub", "x.gz", "y.gz", "z.txt"]]
+        assert list(wandio.listdir(tmpdir)) == names
+        assert sorted(wandio.glob(os.path.join(tmpdir, "*.gz"))) == \
+            names[2:4]
+        assert list(wandio.glob(os.path.join(tmpdir, "*", "*.gz"))) == \
+            [os.path.join(tmpdir, "sub", "w.gz")]
+        for entry in wandio.glob(os.path.join(tmpdir, "*"), details=True):
+            assert entry["is_dir"] == entry["name"].endswith("sub")
+            assert entry["mtime"] is not None
+            if not entry["is_dir"]:
+                assert entry["size"] == 5
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,101 @@
+import threading
+import time
+import wandio.wand_http
+
+import servers
+
+
+class CountingHandler(servers.QuietHandler):
+    """
+    Keeps connections alive (as HTTP/1.1 does by default), and counts the
+    connections made to it
+    """
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        servers.QuietHandler.setup(self)
+        with CountingHandler.lock:
+            CountingHandler.connections += 1
+
+
+def new_connections(func):
+    # number of connections made to the server while running func
+    before = CountingHandler.connections
+    func()
+    return CountingHandler.connections - before
+
+
+if __name__ == '__main__':
+
+    with open("test.txt.gz", "rb") as fh:
+        data = fh.read()
+
+    with servers.serving(CountingHandler, threaded=True) as base:
+        url = base + "/test.txt.gz"
+        key = ("http", "127.0.0.1", int(base.rsplit(":", 1)[1]))
+
+        def get(pool):
+            res = pool.request("GET", url)
+            assert res.read() == data
+            res.close()
+
+        # requests made one after another all use the same connection
+        pool = wandio.wand_http.HttpConnectionPool()
+        assert new_connections(lambda: [get(pool) for _ in range(5)]) == 1
+        pool.close()
+
+        # only max_connections idle connections are kept
+        pool = wandio.wand_http.HttpConnectionPool(max_connections=2)
+
+        def get_at_once(n):
+            responses = [pool.request("GET", url) for _ in range(n)]
+            for res in responses:
+                assert res.read() == data
+
+        assert new_connections(lambda: get_at_once(4)) == 4
+        assert len(pool.idle[key]) == 2
+        assert new_connections(lambda: get_at_once(4)) == 2
+        pool.close()
+
+        # connections that have been idle for too long aren't reused
+        pool = wandio.wand_http.HttpConnectionPool(idle_timeout=0.2)
+        get(pool)
+        assert new_connections(lambda: get(pool)) == 0
+        time.sleep(0.3)
+        assert new_connections(lambda: get(pool)) == 1
+        pool.close()
+
+        # a response that is closed before it has been read completely
+        # closes its connection (the rest of the body is still on it)
+        pool = wandio.wand_http.HttpConnectionPool()
+        res = pool.request("GET", url)
+        assert res.read(10) == data[:10]
+        res.close()
+        assert not pool.idle.get(key)
+        assert new_connections(lambda: get(pool)) == 1
+        pool.close()
+
+        # the pool can be shared by threads, which reuse its connections
+        pool = wandio.wand_http.HttpConnectionPool(max_connections=8)
+        errors = []
+
+        def get_many():
+            try:
+                for _ in range(20):
+                    get(pool)
+            except BaseException as e:
+                errors.append(e)
+
+        def get_concurrently():
+            threads = [threading.Thread(target=get_many) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert new_connections(get_concurrently) <= 8
+        assert not errors, errors
+        pool.close()
@@ -0,0 +1,100 @@
+import os
+import wandio
+import wandio.wand_http
+
+from urllib.parse import urlsplit
+
+import servers
+
+
+class ProxyHandler(servers.RangeRequestHandler):
+    """
+    Acts as an HTTP proxy for any host, serving files from the current
+    directory (proxies are sent the whole URL)
+    """
+
+    def translate_path(self, path):
+        return servers.RangeRequestHandler.translate_path(
+            self, urlsplit(path).path)
+
+
+if __name__ == '__main__':
+
+    with servers.serving(servers.RangeRequestHandler) as base:
+        url = base + "/test.txt.gz"
+
+        with wandio.open(url, connections=4, range_size=512) as fh:
+            line_count = 0
+            word_count = 0
+            for line in fh:
+                word_count += len(line.rstrip().split())
+                line_count +=1
+            print(line_count, word_count)
+
+        # seeking over a single connection (with Range requests) or by
+        # fetching ranges, compared with the file itself
+        with open("test.txt.gz", "rb") as fh:
+            data = fh.read()
+        for connections in [1, 4]:
+            fh = wandio.wand_http.HttpReader(url, connections=connections,
+                                             range_size=128)
+            assert fh.read(100) == data[:100]
+            assert fh.tell() == 100
+            for (offset, whence, expected) in [(500, os.SEEK_SET, 500),
+                                               (10, os.SEEK_CUR, 610),
+                                               (3, os.SEEK_SET, 3)]:
+                assert fh.seek(offset, whence) == expected
+                assert fh.read(100) == data[expected:expected + 100]
+                assert fh.tell() == expected + 100
+            fh.close()
+
+        # no more than max_buffer bytes of ranges are fetched ahead, however
+        # many connections there are
+        for (max_buffer, max_pending) in [(256, 2), (100, 1), (10000, 4)]:
+            fh = wandio.wand_http.HttpReader(url, connections=4,
+                                             range_size=128,
+                                             max_buffer=max_buffer)
+            assert fh.fh.max_pending == max_pending
+            assert fh.read(300) == data[:300]
+            assert len(fh.fh.pending) <= max_pending
+            assert fh.read() == data[300:]
+            fh.close()
+
+        # seeking within the decompressed data, with an index
+        index = wandio.GzipIndex()
+        with wandio.open(url, "rb", index=index) as fh:
+            plain = fh.read()
+            fh.seek(1000)
+            assert fh.read(50) == plain[1000:1050]
+        with wandio.open(url, "rb", index=index) as fh:
+            fh.seek(1000)
+            assert fh.tell() == 1000
+            assert fh.read(50) == plain[1000:1050]
+
+        # the HTTP layer counts the (compressed) bytes it returned, and when
+        # the first of them arrived
+        for connections in [1, 4]:
+            with wandio.open(url, connections=connections, stats=True) as fh:
+                fh.read()
+                layers = dict((layer["layer"], layer)
+                              for layer in fh.stats()["layers"])
+            assert layers["GzipReader"]["bytes_in"] == len(data)
+            assert layers["HttpReader"]["bytes"] == len(data)
+            assert layers["HttpReader"]["ttfb"] >= 0
+
+    # seeking through a proxy (for a host that doesn't exist)
+    with servers.serving(ProxyHandler) as proxy:
+        os.environ["http_proxy"] = proxy
+        os.environ["no_proxy"] = ""
+        try:
+            fh = wandio.wand_http.HttpReader(
+                "http://wandio.invalid/test.txt.gz")
+            assert fh.read(100) == data[:100]
+            assert fh.tell() == 100
+            assert fh.seek(10, os.SEEK_CUR) == 110
+            assert fh.read(100) == data[110:210]
+            assert fh.tell() == 210
+            fh.close()
+        finally:
+            del os.environ["http_proxy"]
+            del os.environ["no_proxy"]
@@ -0,0 +1,28 @@
+import os
+import wandio
+
+import servers
+
+
+if __name__ == '__main__':
+
+    size = os.stat("test.txt.gz").st_size
+    with servers.serving(servers.QuietHandler) as base:
+        filenames = [
+            base + "/test.txt.gz",
+            "missing.gz",
+            "test.txt.gz",
+            base + "/missing.gz",
+            base + "/test.txt.gz",
+        ]
+        for concurrency in [1, 4]:
+            results = wandio.stat_many(filenames, concurrency=concurrency)
+            assert len(results) == len(filenames)
+            # results are in the order of the files, with the errors of
+            # files that couldn't be stat'ed in their place
+            for (filename, result) in zip(filenames, results):
+                if "missing" in filename:
+                    assert isinstance(result, Exception), filename
+                else:
+                    assert result["size"] == size, filename
+                    assert result["mtime"] is not None, filename
@@ -0,0 +1,34 @@
+import subprocess
+import sys
+
+# modules that are slow to import, and should only be imported once a file
+# that needs them is opened
+SLOW_MODULES = ["swiftclient", "wandio.swift", "wandio.wand_http",
+                "wandio.compressed", "zstandard", "lz4", "concurrent.futures"]
+
+SCRIPT = """
+import sys
+import wandio
+
+def loaded():
+    return [m for m in %r if m in sys.modules]
+
+assert not loaded(), "imported by 'import wandio': %%s" %% loaded()
+
+line_count = 0
+word_count = 0
+with wandio.open("test.txt.gz") as fh:
+    for line in fh:
+        word_count += len(line.rstrip().split())
+        line_count += 1
+
+# reading a local gzip file needs wandio.compressed, but not the rest
+assert loaded() == ["wandio.compressed"], loaded()
+print(line_count, word_count)
+""" % SLOW_MODULES
+
+if __name__ == '__main__':
+
+    # run in a new interpreter, so that nothing has been imported yet
+    out = subprocess.check_output([sys.executable, "-c", SCRIPT])
+    print(out.decode("utf-8").strip())
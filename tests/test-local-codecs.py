@@ -0,0 +1,66 @@
+import bz2
+import os
+import shutil
+import tempfile
+import wandio
+
+# zstd and lz4 are only tested if their (optional) packages are installed
+SUFFIXES = [".gz", ".bz2", ".xz"]
+try:
+    import zstandard
+    SUFFIXES.append(".zst")
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+    SUFFIXES.append(".lz4")
+except ImportError:
+    pass
+
+
+def read_lines(filename):
+    with wandio.open(filename) as fh:
+        return list(fh)
+
+
+if __name__ == '__main__':
+
+    expected = read_lines("test.txt.gz")
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for suffix in SUFFIXES:
+            filename = os.path.join(tmpdir, "test" + suffix)
+            with wandio.open(filename, mode="w") as fh:
+                for line in expected:
+                    fh.write(line)
+            assert read_lines(filename) == expected, suffix
+
+            # without a suffix, the codec is found from the magic bytes
+            plain_name = os.path.join(tmpdir, "test-" + suffix[1:])
+            shutil.copy(filename, plain_name)
+            assert read_lines(plain_name) == expected, suffix
+
+        # text that happens to start like a bzip2 header is still text
+        for text in ["BZh\n", "BZh9 is not bzip2\n", "BZh91AY\n"]:
+            filename = os.path.join(tmpdir, "test-text")
+            with open(filename, "w") as fh:
+                fh.write(text)
+            assert read_lines(filename) == [text]
+
+        # an empty bzip2 stream has no block, but is still recognized
+        filename = os.path.join(tmpdir, "test-empty")
+        with open(filename, "wb") as fh:
+            fh.write(bz2.compress(b""))
+        assert read_lines(filename) == []
+
+        if zstandard is not None:
+            # files made up of several zstd frames
+            data = "".join(expected).encode("utf-8")
+            cctx = zstandard.ZstdCompressor()
+            filename = os.path.join(tmpdir, "test-frames.zst")
+            with open(filename, "wb") as fh:
+                fh.write(cctx.compress(data[:500]) + cctx.compress(data[500:]))
+            assert read_lines(filename) == expected
+    finally:
+        shutil.rmtree(tmpdir)
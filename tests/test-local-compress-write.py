@@ -0,0 +1,58 @@
+import bz2
+import os
+import shutil
+import tempfile
+import zlib
+import wandio
+
+
+def write(filename, lines, **kwargs):
+    with wandio.open(filename, mode='w', **kwargs) as ofh:
+        for line in lines:
+            ofh.write(line)
+    with open(filename, 'rb') as fh:
+        return fh.read()
+
+
+if __name__ == '__main__':
+
+    with wandio.open('test.txt.gz') as fh:
+        lines = list(fh)
+    # enough data for the compression level to make a difference
+    lines = lines * 50
+    data = "".join(lines).encode("utf-8")
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        gz = os.path.join(tmpdir, 'test-level.txt.gz')
+        bz = os.path.join(tmpdir, 'test-level.txt.bz2')
+        for level in [1, 9]:
+            # the level reaches the compressor, which then writes the same
+            # data as zlib/bz2 do at that level, whether the compressed
+            # output is coalesced into large writes or not
+            expected = zlib.compressobj(level, zlib.DEFLATED,
+                                        16 + zlib.MAX_WBITS)
+            expected = expected.compress(data) + expected.flush()
+            for high_water in [1, 1024, 1024 * 1024]:
+                options = {"compresslevel": level, "high_water": high_water}
+                assert write(gz, lines, options=options) == expected
+                assert write(bz, lines, options=options) == \
+                    bz2.compress(data, level)
+                with wandio.open(gz) as fh:
+                    assert list(fh) == lines
+
+        # the parallel writers take the same option
+        sizes = []
+        for level in [1, 9]:
+            options = {"compresslevel": level}
+            sizes.append(len(write(gz, lines, options=options, workers=2,
+                                   block_size=16 * 1024)))
+            with wandio.open(gz) as fh:
+                assert list(fh) == lines
+            assert write(bz, lines, options=options, workers=2,
+                         block_size=16 * 1024) == \
+                b"".join(bz2.compress(data[i:i + 16 * 1024], level)
+                         for i in range(0, len(data), 16 * 1024))
+        assert sizes[1] < sizes[0]
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,58 @@
+import gzip
+import os
+import random
+import shutil
+import tempfile
+import wandio
+
+if __name__ == '__main__':
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        # (random data, so that it doesn't compress too well and the index
+        # gets several points)
+        rand = random.Random(1)
+        data = b"".join(b"%d %x\n" % (i, rand.getrandbits(128))
+                        for i in range(100000))
+        filename = os.path.join(tmpdir, "test-seek.gz")
+        with gzip.open(filename, "wb") as fh:
+            fh.write(data)
+
+        index = wandio.GzipIndex(spacing=64 * 1024)
+        with wandio.open(filename, "rb", index=index) as fh:
+            assert fh.read() == data
+        assert len(index.offsets) > 1
+
+        offsets = [0, 1, 100000, len(data) // 2, len(data) - 10, 5000]
+        with wandio.open(filename, "rb", index=index) as fh:
+            for offset in offsets:
+                assert fh.seek(offset) == offset
+                assert fh.tell() == offset
+                assert fh.read(1000) == data[offset:offset + 1000]
+                assert fh.tell() == min(offset + 1000, len(data))
+
+        # tell while iterating over lines, then seek back to where some of
+        # them started
+        lines = data.splitlines(True)
+        for mode in ["r", "rb"]:
+            with wandio.open(filename, mode, index=index) as fh:
+                starts = [fh.tell()]
+                for line in fh:
+                    starts.append(fh.tell())
+                assert starts[-1] == len(data)
+                assert len(starts) == len(lines) + 1
+                for i in [50000, 3, 99999]:
+                    assert starts[i] == starts[i - 1] + len(lines[i - 1])
+                    fh.seek(starts[i])
+                    line = fh.readline()
+                    if mode == "r":
+                        line = line.encode("utf-8")
+                    assert line == lines[i]
+    finally:
+        shutil.rmtree(tmpdir)
+
+    # rewinding the test file
+    with wandio.open('test.txt.gz', "rb", index=wandio.GzipIndex()) as fh:
+        data = fh.read()
+        fh.seek(0)
+        assert b"".join(fh) == data
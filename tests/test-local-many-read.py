@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import wandio
+
+if __name__ == '__main__':
+
+    with wandio.open("test.txt.gz") as fh:
+        expected = list(fh)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        # files of different sizes and encodings, so that they finish
+        # opening in a different order to the one they're read in
+        filenames = []
+        for i in range(10):
+            filename = os.path.join(tmpdir, "test-%d.txt%s" %
+                                    (i, [".gz", ".bz2", ""][i % 3]))
+            with wandio.open(filename, mode="w") as fh:
+                fh.write("".join(expected[:i * 4 + 1]))
+            filenames.append(filename)
+
+        for prefetch in [0, 1, 3, 10]:
+            with wandio.open_many(filenames, prefetch=prefetch,
+                                  with_filename=True) as fh:
+                lines = list(fh)
+            assert lines == [(filename, line) for (i, filename) in
+                             enumerate(filenames)
+                             for line in expected[:i * 4 + 1]], prefetch
+
+        # missing files are skipped with on_error, and raise otherwise
+        missing = os.path.join(tmpdir, "missing.gz")
+        errors = []
+        with wandio.open_many([missing, filenames[9], missing],
+                              on_error=lambda f, e: errors.append(f)) as fh:
+            assert list(fh) == expected[:37]
+        assert errors == [missing, missing]
+        try:
+            with wandio.open_many([filenames[9], missing]) as fh:
+                list(fh)
+            assert False, "expected an error"
+        except (IOError, OSError):
+            pass
+
+        # and read as a stream of data
+        with wandio.open_many(filenames[1:], mode="rb") as fh:
+            data = fh.read()
+        assert data == b"".join("".join(expected[:i * 4 + 1]).encode("utf-8")
+                                for i in range(1, 10))
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,60 @@
+import os
+import random
+import shutil
+import tempfile
+import wandio
+
+if __name__ == '__main__':
+
+    # characters of one to four bytes, some of which straddle the ends of
+    # the blocks that are read (BUFLEN), split into lines (LINE_BLOCK) and
+    # decompressed, lines that are longer than a block, and short ones (the
+    # characters are random so that the data doesn't compress too well,
+    # and is decompressed in many blocks)
+    rand = random.Random(1)
+    chars = u"abcdefghijklmnopqrstuvwxyz0123456789 éüßçñø€™→ÿ😀🐍"
+    lines = [u"a" * 4095 + u"€" + u"b" * (65536 - 4098 - 1) + u"€é\n"]
+    for i in range(500):
+        size = rand.choice([0, 1, 10, 100, 1000, 20000])
+        lines.append(u"line %d " % i +
+                     u"".join(rand.choice(chars) for _ in range(size)) +
+                     u"\n")
+    lines.append(u"no newline 😀")
+    data = u"".join(lines).encode("utf-8")
+    assert data[4095:4098] == u"€".encode("utf-8")
+    assert data[65535:65538] == u"€".encode("utf-8")
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmpdir, "test-mixed.txt.gz")
+        with wandio.open(filename, mode="wb") as fh:
+            fh.write(data)
+
+        for mode in ["rb", "r"]:
+            with wandio.open(filename, mode=mode) as fh:
+                pos = 0
+                while pos < len(data):
+                    op = rand.choice(["next", "readline", "read"])
+                    if op == "read":
+                        size = rand.choice([1, 2, 3, 100, 4096, 70000])
+                        # in text mode, stop reading bytes at a character
+                        # boundary so that lines can be decoded after
+                        while mode == "r" and pos + size < len(data) and \
+                                data[pos + size] & 0xc0 == 0x80:
+                            size += 1
+                        assert fh.read(size) == data[pos:pos + size]
+                        pos = min(pos + size, len(data))
+                    else:
+                        end = data.find(b"\n", pos) + 1 or len(data)
+                        line = data[pos:end]
+                        if mode == "r":
+                            line = line.decode("utf-8")
+                        if op == "next":
+                            assert next(fh) == line
+                        else:
+                            assert fh.readline() == line
+                        pos = end
+                    assert fh.tell() == pos
+                assert fh.read() == b""
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,38 @@
+import bz2
+import os
+import shutil
+import tempfile
+import wandio
+
+if __name__ == '__main__':
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for name in ['test-parallel.txt.gz', 'test-parallel.txt.bz2']:
+            filename = os.path.join(tmpdir, name)
+            with wandio.open('test.txt.gz') as fh:
+                with wandio.open(filename, mode='w', workers=4,
+                                 block_size=1024) as ofh:
+                    for line in fh:
+                        ofh.write(line)
+
+            with wandio.open(filename, workers=4) as fh:
+                line_count = 0
+                word_count = 0
+                for line in fh:
+                    word_count += len(line.rstrip().split())
+                    line_count +=1
+                print(line_count, word_count)
+
+        # empty bzip2 streams have no block, and so aren't split off from
+        # the streams around them
+        empty = bz2.compress(b"")
+        abc = bz2.compress(b"abc\n")
+        for data in [abc + empty, empty + abc + empty, empty + empty]:
+            filename = os.path.join(tmpdir, 'test-empty-streams.bz2')
+            with open(filename, 'wb') as fh:
+                fh.write(data)
+            with wandio.open(filename, mode='rb', workers=2) as fh:
+                assert fh.read() == bz2.decompress(data)
+    finally:
+        shutil.rmtree(tmpdir)
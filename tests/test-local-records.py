@@ -0,0 +1,57 @@
+import os
+import shutil
+import struct
+import tempfile
+import wandio
+
+if __name__ == '__main__':
+
+    # split the file into records on newlines
+    with wandio.open("test.txt.gz", mode="rb") as fh:
+        records = list(fh.iter_records(delimiter=b"\n", keepends=True))
+
+    # write them back out as length-prefixed records, and read those back
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmpdir, "test-records.gz")
+        with wandio.open(filename, mode="wb") as fh:
+            for record in records:
+                fh.write(struct.pack("!I", len(record)) + record)
+
+        with wandio.open(filename, mode="rb") as fh:
+            assert list(fh.iter_length_prefixed()) == records
+    finally:
+        shutil.rmtree(tmpdir)
+
+    # and in fixed-size chunks
+    with wandio.open("test.txt.gz", mode="rb") as fh:
+        chunks = list(fh.iter_chunks(100))
+        assert all(len(chunk) == 100 for chunk in chunks[:-1])
+        assert b"".join(chunks) == b"".join(records)
+
+    # mixing record iteration with other reads on a stream that wandio
+    # buffers itself, which carries on from where the records stopped
+    records = [b"record %d\n" % i * (i % 50) for i in range(2000)]
+    data = b"\0".join(records)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmpdir, "test-records")
+        with open(filename, "wb") as fh:
+            fh.write(data)
+
+        for mode in ["rb", "r"]:
+            with wandio.file.SimpleReader(filename, mode=mode) as fh:
+                assert next(fh.iter_records()) == records[0]
+                assert next(fh.iter_records()) == records[1]
+                offset = len(records[0]) + len(records[1]) + 2
+                assert fh.tell() == offset
+                assert next(fh.iter_chunks(5)) == data[offset:offset + 5]
+                assert fh.read(10) == data[offset + 5:offset + 15]
+                line = data[offset + 15:data.index(b"\n", offset + 15) + 1]
+                if mode == "r":
+                    line = line.decode("utf-8")
+                assert fh.readline() == line
+                assert fh.seek(0) == 0
+                assert list(fh.iter_records()) == records
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,37 @@
+import os
+import shutil
+import tempfile
+import wandio
+
+
+def count(filename, splits, **kwargs):
+    lines = []
+    for split in splits:
+        with wandio.open(filename, byte_range=split, **kwargs) as fh:
+            lines.extend(fh)
+    return lines
+
+
+if __name__ == '__main__':
+
+    with wandio.open("test.txt.gz") as fh:
+        expected = list(fh)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        # an uncompressed copy can be split anywhere
+        filename = os.path.join(tmpdir, "test-splits.txt")
+        with wandio.open(filename, mode="w") as fh:
+            fh.write("".join(expected))
+
+        for n in [1, 2, 3, 8, 100]:
+            splits = wandio.plan_splits(filename, n)
+            assert count(filename, splits) == expected, n
+
+        # every possible split point
+        size = wandio.stat(filename)["size"]
+        for offset in range(size + 1):
+            splits = [(0, offset), (offset, size)]
+            assert count(filename, splits) == expected, offset
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,30 @@
+import os
+import wandio
+
+if __name__ == '__main__':
+
+    snapshots = []
+    with wandio.open("test.txt.gz", stats_callback=snapshots.append) as fh:
+        line_count = 0
+        size = 0
+        for line in fh:
+            line_count += 1
+            size += len(line.encode("utf-8"))
+
+    # the callback gets the final stats when the file is closed
+    assert len(snapshots) == 1
+    layers = dict((layer["layer"], layer) for layer in snapshots[0]["layers"])
+    assert [layer["layer"] for layer in snapshots[0]["layers"]] == \
+        ["StatsReader", "GzipReader", "MmapReader"]
+    assert layers["StatsReader"]["lines"] == line_count
+    assert layers["StatsReader"]["bytes"] == size
+    # everything the transport read went into the decompressor, and
+    # everything that came out of it was returned
+    compressed_size = os.path.getsize("test.txt.gz")
+    assert layers["MmapReader"]["bytes"] == compressed_size
+    assert layers["GzipReader"]["bytes_in"] == compressed_size
+    assert layers["GzipReader"]["bytes_out"] == size
+
+    # files opened without stats don't keep any
+    with wandio.open("test.txt.gz") as fh:
+        assert fh.stats() is None
@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import wandio
+
+if __name__ == '__main__':
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filenames = [os.path.join(tmpdir, name) for name in
+                     ['test-tee-1.txt.gz', 'test-tee-2.txt.gz']]
+
+        # an exception while writing leaves neither file behind
+        try:
+            with wandio.open(filenames, mode='w') as ofh:
+                ofh.write("partial\n")
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        assert not os.listdir(tmpdir)
+
+        # with on_error="drop", a file that can't be opened is skipped
+        bad = os.path.join(tmpdir, 'missing', 'test-tee.txt.gz')
+        with wandio.open([bad, filenames[0]], mode='w',
+                         on_error='drop') as ofh:
+            ofh.write("dropped\n")
+        assert list(ofh.errors()) == [bad]
+        with wandio.open(filenames[0]) as fh:
+            assert list(fh) == ["dropped\n"]
+        try:
+            wandio.open([bad, filenames[0]], mode='w')
+            assert False, "expected an error"
+        except (IOError, OSError):
+            pass
+
+        with wandio.open('test.txt.gz') as fh:
+            with wandio.open(filenames, mode='w') as ofh:
+                for line in fh:
+                    ofh.write(line)
+
+        # the data is only compressed once, so the files are identical
+        with open(filenames[0], 'rb') as fh1, open(filenames[1], 'rb') as fh2:
+            assert fh1.read() == fh2.read()
+
+        with wandio.open(filenames[1]) as fh:
+            line_count = 0
+            word_count = 0
+            for line in fh:
+                word_count += len(line.rstrip().split())
+                line_count +=1
+            print(line_count, word_count)
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,50 @@
+import io
+import os
+import shutil
+import tempfile
+import wandio
+import wandio.opener
+
+if __name__ == '__main__':
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        # multibyte characters and CRLF line endings, which text mode
+        # decodes and translates like open() does
+        filename = os.path.join(tmpdir, 'test-text.txt')
+        with open(filename, 'wb') as fh:
+            fh.write((u"é" * 5000 + u"\r\n").encode("utf-8") * 3)
+        with open(filename) as fh:
+            expected = fh.read()
+
+        with wandio.open(filename) as fh:
+            assert fh.read() == expected
+        with wandio.open(filename) as fh:
+            assert fh.read(4097) == expected[:4097]
+            assert fh.readline() == expected[4097:].split("\n")[0] + "\n"
+        with wandio.open(filename) as fh:
+            assert list(fh) == expected.splitlines(True)
+        with wandio.open(filename, 'rb') as fh:
+            assert fh.read().count(b"\r\n") == 3
+        # copying text (as pywandio-cat does) falls back to read
+        for stats in [False, True]:
+            out = io.BytesIO()
+            with wandio.open(filename, stats=stats) as fh:
+                wandio.opener.copyfileobj(fh, out)
+            assert out.getvalue() == expected.encode("utf-8")
+
+        # and a plain copy of the test file
+        with wandio.open('test.txt.gz') as fh:
+            lines = list(fh)
+        filename = os.path.join(tmpdir, 'test.txt')
+        with open(filename, 'w') as fh:
+            fh.write("".join(lines))
+        with wandio.open(filename) as fh:
+            line_count = 0
+            word_count = 0
+            for line in fh:
+                word_count += len(line.rstrip().split())
+                line_count +=1
+            print(line_count, word_count)
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,76 @@
+import time
+import swiftclient.client
+import wandio
+import wandio.swift
+
+import servers
+
+DATA = b"".join(b"line %d\n" % i for i in range(1000))
+
+
+def options(base, user, **kwargs):
+    return dict({
+        "auth_version": "1.0",
+        "auth": base + "/auth/v1.0",
+        "user": user,
+        "key": "secret",
+    }, **kwargs)
+
+
+def read(options, connections=1):
+    with wandio.open("swift://test/data.txt", mode="rb", options=options,
+                     connections=connections, range_size=1000) as fh:
+        return fh.read()
+
+
+def cached_until(pool, options):
+    key = wandio.swift._options_key(wandio.swift.process_options(options))
+    return pool.tokens[key][2]
+
+
+if __name__ == '__main__':
+
+    handler = servers.SwiftRequestHandler
+    handler.objects["test/data.txt"] = DATA
+    pool = wandio.swift.ConnectionPool()
+    wandio.swift.set_default_pool(pool)
+
+    with servers.serving(handler, threaded=True) as base:
+        alice = options(base, "alice")
+        bob = options(base, "bob")
+
+        # one auth for each set of options, however many connections are
+        # made with them
+        for _ in range(3):
+            assert read(alice, connections=4) == DATA
+            assert read(bob) == DATA
+        assert handler.auths == {"alice": 1, "bob": 1}, handler.auths
+
+        # a rejected token is replaced, and the new one is cached
+        handler.valid_tokens.clear()
+        assert read(alice) == DATA
+        assert read(alice, connections=4) == DATA
+        assert handler.auths["alice"] == 2, handler.auths
+
+        # tokens are replaced before the auth service says they expire...
+        handler.token_lifetime = 600
+        carol = options(base, "carol")
+        read(carol)
+        expected = time.time() + 600 - wandio.swift.TOKEN_EXPIRY_MARGIN
+        assert abs(cached_until(pool, carol) - expected) < 10
+
+        # ...or after token_ttl, if that is sooner
+        dave = options(base, "dave", token_ttl=0)
+        read(dave)
+        read(dave)
+        assert handler.auths["dave"] == 2, handler.auths
+
+        # Keystone is asked when its tokens expire
+        conn = swiftclient.client.Connection(base, "erin", "secret",
+                                             auth_version="3")
+        token = next(iter(handler.valid_tokens))
+        expires = wandio.swift._keystone_token_expiry(conn, token)
+        assert abs(expires - (time.time() + 600)) < 10
+        assert wandio.swift._keystone_token_expiry(conn, "unknown") is None
+
+    pool.close()
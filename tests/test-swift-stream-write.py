@@ -0,0 +1,54 @@
+import gzip
+import wandio
+
+import servers
+
+
+if __name__ == '__main__':
+
+    with servers.serving(servers.SwiftRequestHandler, threaded=True) as base:
+        options = {
+            "os_storage_url": base + "/v1/AUTH_test",
+            "os_auth_token": "test",
+            # use tiny segments so that the file is uploaded in several parts
+            "segment_size": 512,
+            "segment_threads": 2,
+        }
+
+        with gzip.open("test.txt.gz", "rb") as fh:
+            data = fh.read()
+
+        with wandio.open("swift://test/test.txt.gz", mode="w",
+                         options=options) as fh:
+            fh.write(data)
+
+        segments = [name for name in servers.SwiftRequestHandler.objects
+                    if name.startswith(".test-segments/")]
+        assert len(segments) > 1
+        assert all(len(servers.SwiftRequestHandler.objects[name]) == 512
+                   for name in sorted(segments)[:-1])
+
+        # writing in pieces that don't line up with the segments gives the
+        # same object
+        with wandio.open("swift://test/pieces.txt", mode="w",
+                         options=options) as fh:
+            for i in range(0, len(data), 100):
+                fh.write(data[i:i + 100])
+        with wandio.open("swift://test/pieces.txt", mode="rb",
+                         options=options) as fh:
+            assert fh.read() == data
+
+        # read it back in a single stream, and in ranges over several
+        # connections
+        counts = []
+        for connections in [1, 4]:
+            with wandio.open("swift://test/test.txt.gz", options=options,
+                             connections=connections, range_size=300) as fh:
+                line_count = 0
+                word_count = 0
+                for line in fh:
+                    word_count += len(line.rstrip().split())
+                    line_count +=1
+                counts.append((line_count, word_count))
+        assert counts[0] == counts[1]
+        print(line_count, word_count)
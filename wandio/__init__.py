@@ -1,4 +1,18 @@
 from .opener import wandio_open as open
 from .opener import wandio_stat as stat
+from .opener import stat_many
+from .opener import listdir
+from .opener import glob
+from .opener import plan_splits
+from .opener import open_many
 from .opener import Reader
 from .opener import Writer
+from .tee import TeeWriter
+
+
+def __getattr__(name):
+    # wandio.compressed is only imported once it's needed
+    if name == "GzipIndex":
+        from .compressed import GzipIndex
+        return GzipIndex
+    raise AttributeError("module 'wandio' has no attribute '%s'" % name)
@@ -0,0 +1,342 @@
+"""
+asyncio interface to pywandio (Python 3 only):
+
+    async with wandio.aio.open(url) as fh:
+        async for line in fh:
+            ...
+
+HTTP files are downloaded with non-blocking sockets on the event loop.
+Other transports (local files, stdin, Swift and proxied HTTP) use the
+blocking readers from a thread pool. Decompression also runs in the thread
+pool, so that the event loop is never blocked and one loop can read many
+files at once.
+"""
+
+import asyncio
+import email.parser
+import http.client as httplib
+import ssl
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit
+
+import wandio.codec
+import wandio.file
+import wandio.transport
+import wandio.wand_http
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _NeedData(Exception):
+    """
+    Raised by _Feed when it doesn't have enough data buffered yet
+    """
+
+
+class _Feed(object):
+    """
+    Non-blocking child reader for the (synchronous) codec readers. It only
+    returns data that has already been fed to it, and raises _NeedData if
+    more is needed. Since BlockReaders only change their state once data
+    has been read, the operation can simply be retried once more data has
+    been fed in.
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.pos = 0
+        self.eof = False
+        # the amount of data that the last read that failed wanted
+        self.wanted = 1
+
+    @property
+    def buffered(self):
+        return len(self.buf) - self.pos
+
+    def feed(self, chunk):
+        if not len(chunk):
+            self.eof = True
+            return
+        if self.pos >= self.buffered:
+            del self.buf[:self.pos]
+            self.pos = 0
+        self.buf += chunk
+
+    def peek(self, size):
+        return bytes(self.buf[self.pos:self.pos+size])
+
+    def read(self, size):
+        if self.buffered < size and not self.eof:
+            self.wanted = size
+            raise _NeedData()
+        data = bytes(self.buf[self.pos:self.pos+size])
+        self.pos += len(data)
+        return data
+
+    def read_chunk(self):
+        """
+        Return all of the data that has been fed in, or b"" at EOF
+        """
+        if not self.buffered and not self.eof:
+            self.wanted = 1
+            raise _NeedData()
+        return self.read(self.buffered)
+
+    def close(self):
+        self.buf = bytearray()
+        self.pos = 0
+
+
+class _PlainReader(wandio.file.BlockReader):
+    """
+    Splits and decodes data from the feed (for data that isn't compressed)
+    """
+
+    def _read_block(self):
+        return self.fh.read_chunk()
+
+
+class _ExecutorSource(object):
+    """
+    Reads data from a blocking reader in a thread pool
+    """
+
+    def __init__(self, opener, loop, executor):
+        self.opener = opener
+        self.loop = loop
+        self.executor = executor
+        self.fh = None
+
+    async def open(self):
+        self.fh = await self.loop.run_in_executor(self.executor, self.opener)
+
+    async def read_chunk(self):
+        return await self.loop.run_in_executor(self.executor, self.fh.read,
+                                               CHUNK_SIZE)
+
+    async def close(self):
+        if self.fh is not None:
+            await self.loop.run_in_executor(self.executor, self.fh.close)
+
+
+class _HttpSource(object):
+    """
+    Reads the body of an HTTP response using asyncio streams
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.reader = None
+        self.writer = None
+        self.chunked = False
+        # remaining bytes of the body (or of the current chunk when the
+        # response is chunked), or None to read until the connection closes
+        self.remaining = None
+
+    async def _request(self, url):
+        parts = urlsplit(url)
+        https = parts.scheme == "https"
+        port = parts.port or (443 if https else 80)
+        (self.reader, self.writer) = await asyncio.open_connection(
+            parts.hostname, port,
+            ssl=ssl.create_default_context() if https else None)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        request = ("GET %s HTTP/1.1\r\n"
+                   "Host: %s\r\n"
+                   "User-Agent: %s\r\n"
+                   "Accept-Encoding: identity\r\n"
+                   "Connection: close\r\n\r\n" %
+                   (path, parts.netloc, wandio.wand_http.USER_AGENT))
+        self.writer.write(request.encode("latin-1"))
+        status_line = (await self.reader.readline()).decode("latin-1")
+        try:
+            (_, status, reason) = (status_line.rstrip("\r\n") + " ").split(
+                " ", 2)
+            status = int(status)
+        except ValueError:
+            raise httplib.BadStatusLine(status_line)
+        lines = []
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            lines.append(line.decode("latin-1"))
+        hdrs = email.parser.Parser(_class=httplib.HTTPMessage).parsestr(
+            "".join(lines))
+        return status, reason.strip(), hdrs
+
+    async def open(self):
+        url = self.url
+        for _ in range(wandio.wand_http.MAX_REDIRECTS + 1):
+            (status, reason, hdrs) = await self._request(url)
+            if status < 300:
+                break
+            await self.close()
+            location = hdrs.get("Location")
+            if status in wandio.wand_http.REDIRECT_CODES and location:
+                url = urljoin(url, location)
+                continue
+            raise HTTPError(url, status, reason, hdrs, None)
+        else:
+            raise HTTPError(url, status, "Too many redirects", hdrs, None)
+        self.chunked = "chunked" in hdrs.get("Transfer-Encoding", "").lower()
+        if self.chunked:
+            self.remaining = 0
+        elif "Content-Length" in hdrs:
+            self.remaining = int(hdrs["Content-Length"])
+
+    async def read_chunk(self):
+        if self.chunked and not self.remaining:
+            if self.remaining is None:
+                return b""
+            # the chunk size line (after the end of the previous chunk)
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n"):
+                line = await self.reader.readline()
+            self.remaining = int(line.split(b";")[0], 16)
+            if not self.remaining:
+                # skip the trailers
+                while await self.reader.readline() not in (b"\r\n", b"\n",
+                                                           b""):
+                    pass
+                self.remaining = None
+                return b""
+        if self.remaining is None:
+            return await self.reader.read(CHUNK_SIZE)
+        if not self.remaining:
+            return b""
+        chunk = await self.reader.read(min(self.remaining, CHUNK_SIZE))
+        if not chunk:
+            raise httplib.IncompleteRead(b"", self.remaining)
+        self.remaining -= len(chunk)
+        return chunk
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class AsyncReader(object):
+    """
+    Reads a file of any of the types that wandio.open supports, without
+    blocking the event loop. Use with "async with".
+    """
+
+    def __init__(self, filename, mode="r", options=None, executor=None):
+        """
+        :param filename: file name or URL to read
+        :param mode: "r" to read strings or "rb" to read bytes
+        :param options: swift and HTTP options, as for wandio.open
+        :param executor: thread pool to run blocking reads and
+        decompression in (the event loop's default executor if None)
+        """
+        if mode not in ["r", "rb"]:
+            raise ValueError("Invalid mode. Mode must be either 'r' or 'rb'")
+        self.filename = filename
+        self.binary = mode == "rb"
+        self.options = options
+        self.executor = executor
+        self.loop = None
+        self.source = None
+        self.feed = _Feed()
+        self.fh = None
+        # whether calls on fh are expensive enough to run in the executor
+        self.offload = False
+
+    def _get_source(self):
+        filename = self.filename
+        options = self.options
+        parts = urlsplit(filename)
+        if parts.scheme in ["http", "https"] and parts.netloc and \
+                not wandio.wand_http._use_proxy(parts):
+            return _HttpSource(filename)
+        transport = wandio.transport.find(filename)
+        return _ExecutorSource(
+            lambda: transport.reader(filename, mode="rb", options=options),
+            self.loop, self.executor)
+
+    async def _fill(self, size):
+        while self.feed.buffered < size and not self.feed.eof:
+            self.feed.feed(await self.source.read_chunk())
+
+    async def _call(self, func, *args):
+        # retry the call until the feed has enough data for it to complete
+        # (buffering at least a chunk so that we don't make a trip to the
+        # executor for every small read the decompressor makes)
+        while True:
+            await self._fill(max(self.feed.wanted, CHUNK_SIZE))
+            try:
+                if self.offload:
+                    return await self.loop.run_in_executor(self.executor,
+                                                           func, *args)
+                return func(*args)
+            except _NeedData:
+                pass
+
+    async def open(self):
+        self.loop = asyncio.get_running_loop()
+        self.source = self._get_source()
+        await self.source.open()
+        # detect the encoding in the same way that wandio.open does
+        codec = wandio.codec.find_by_filename(self.filename)
+        if codec is None:
+            await self._fill(wandio.codec.magic_len())
+            codec = wandio.codec.find_by_magic(
+                self.feed.peek(wandio.codec.magic_len()))
+        if codec is not None:
+            self.fh = codec.reader(self.feed, binary=self.binary)
+            self.offload = True
+        else:
+            self.fh = _PlainReader(self.feed, binary=self.binary)
+        return self
+
+    async def read(self, size=-1):
+        return await self._call(self.fh.read, size)
+
+    async def readline(self):
+        line = await self._call(self.fh.readline)
+        if line is None:
+            return b"" if self.binary else ""
+        return line
+
+    def _next_lines(self):
+        self.fh._queue_lines()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        lines = self.fh.lines
+        if not lines:
+            await self._call(self._next_lines)
+            if not lines:
+                raise StopAsyncIteration
+        return lines.popleft()
+
+    async def close(self):
+        if self.source is not None:
+            await self.source.close()
+            self.source = None
+        if self.fh is not None:
+            self.fh.close()
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, type, value, traceback):
+        await self.close()
+
+
+def open(filename, mode="r", options=None, executor=None):
+    """
+    Open a file for asynchronous reading:
+
+        async with wandio.aio.open(filename) as fh:
+            async for line in fh:
+                ...
+    """
+    return AsyncReader(filename, mode=mode, options=options,
+                       executor=executor)
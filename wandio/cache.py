@@ -0,0 +1,179 @@
+import errno
+import hashlib
+import os
+import tempfile
+import time
+
+import wandio.file
+import wandio.transport
+
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024 * 1024
+# temporary files older than this were left behind by readers that died
+STALE_TMP_AGE = 24 * 60 * 60
+
+DATA_SUFFIX = ".data"
+TMP_SUFFIX = ".tmp"
+
+
+def remote_validator(url, options=None):
+    """
+    Get a string that changes whenever the remote file at the given URL
+    changes (its ETag, or its Last-Modified time and size), or
+    None if the server gives us nothing to validate a cached copy with
+    :param url:
+    :param options:
+    :return:
+    """
+    s = wandio.transport.find(url).stat(url, options=options)
+    (etag, mtime, size) = (s.get("etag"), s.get("mtime"), s.get("size"))
+    if etag:
+        return "etag:%s" % etag
+    if mtime:
+        return "mtime:%s:%s" % (mtime, size)
+    return None
+
+
+def _hash(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class DiskCache(object):
+    """
+    Read-through cache of remote (HTTP and Swift) files in a local
+    directory, which several processes may share.
+
+    Entries are named after the URL and the validator of the version of
+    the file they hold, so a changed remote file is simply a miss. A file
+    is written to a temporary file as it's read for the first time, and
+    renamed into place once it has been read completely. Once the cache
+    is larger than max_size, the least recently used entries are removed.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _prefix(self, url):
+        return os.path.join(self.directory, _hash(url) + "-")
+
+    def _path(self, url, validator):
+        return self._prefix(url) + _hash(validator) + DATA_SUFFIX
+
+    def lookup(self, url, options=None):
+        """
+        Check the cache for the current version of the given file
+        :param url: HTTP or Swift URL
+        :param options: options to stat the file with
+        :return: (path of the cached copy or None, validator of the current
+        version or None if the file can't be cached)
+        """
+        validator = remote_validator(url, options=options)
+        if validator is None:
+            return None, None
+        path = self._path(url, validator)
+        try:
+            # mark the entry as recently used
+            os.utime(path, None)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None, validator
+        return path, validator
+
+    def fill(self, url, validator, fh, binary=False):
+        """
+        Wrap the given reader so that what is read from it is stored in the
+        cache
+        """
+        return CacheFillReader(self, url, validator, fh, binary=binary)
+
+    def _store(self, tmp_path, url, validator):
+        prefix = self._prefix(url)
+        path = self._path(url, validator)
+        # the rename is atomic, so other processes either see the complete
+        # file or no file at all
+        os.rename(tmp_path, path)
+        # remove older versions of the file
+        for name in os.listdir(self.directory):
+            other = os.path.join(self.directory, name)
+            if other.startswith(prefix) and other != path:
+                self._remove(other)
+        self.evict()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except OSError as e:
+            # another process may have removed it
+            if e.errno != errno.ENOENT:
+                raise
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is no larger
+        than max_size
+        """
+        entries = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith(TMP_SUFFIX):
+                if st.st_mtime < now - STALE_TMP_AGE:
+                    self._remove(path)
+                continue
+            if name.endswith(DATA_SUFFIX):
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        entries.sort()
+        for (_, size, path) in entries:
+            if total <= self.max_size:
+                break
+            # processes that are reading the file can carry on doing so
+            self._remove(path)
+            total -= size
+
+
+class CacheFillReader(wandio.file.BlockReader):
+    """
+    Reads a remote file, writing what is read to a temporary file that is
+    added to the cache once the whole file has been read
+    """
+
+    def __init__(self, cache, url, validator, fh, binary=False):
+        self.cache = cache
+        self.url = url
+        self.validator = validator
+        (fd, self.tmp_path) = tempfile.mkstemp(dir=cache.directory,
+                                               suffix=TMP_SUFFIX)
+        self.out = os.fdopen(fd, "wb")
+        super(CacheFillReader, self).__init__(fh, binary=binary)
+
+    def _read_block(self):
+        block = self.fh.read(self.LINE_BLOCK)
+        if self.out is not None:
+            if len(block):
+                self.out.write(block)
+            else:
+                self.out.close()
+                self.out = None
+                self.cache._store(self.tmp_path, self.url, self.validator)
+        return block
+
+    def close(self):
+        if self.out is not None:
+            # the file wasn't read completely, so it can't be cached
+            self.out.close()
+            self.out = None
+            self.cache._remove(self.tmp_path)
+        self.fh.close()
@@ -0,0 +1,176 @@
+import importlib.util
+
+import wandio.plugins
+
+# the codecs' readers and writers import wandio.compressed (and any
+# optional compression packages) when they are first used
+
+
+class Codec(object):
+    """
+    Describes a compression format: the filename suffixes and magic bytes
+    used to recognize it, and factories for its reader and writer.
+    magic is the bytes that data in the format starts with, or a tuple of
+    alternatives (e.g. when a header has a variable field).
+    Readers are created as reader(child, binary=..., **kwargs) and writers
+    as writer(child, options=..., **kwargs), where kwargs are the options
+    passed to Reader/Writer and options is the options dict given to
+    wandio.open (factories should ignore options they don't use).
+    """
+
+    def __init__(self, name, suffixes, magic, reader, writer):
+        self.name = name
+        self.suffixes = tuple(suffixes)
+        self.magic = magic
+        self.reader = reader
+        self.writer = writer
+
+    def __repr__(self):
+        return "Codec(%r)" % self.name
+
+
+_codecs = []
+_plugins_loaded = False
+
+
+def register(codec):
+    """
+    Register a codec. Codecs registered later take precedence over those
+    registered earlier, so this can also be used to replace a built-in codec
+    :param codec: Codec instance
+    """
+    _codecs.insert(0, codec)
+
+
+def codecs():
+    return list(_codecs)
+
+
+def _load_plugins():
+    global _plugins_loaded
+    if _plugins_loaded:
+        return False
+    _plugins_loaded = True
+    # plugins don't take precedence over codecs registered in code
+    _codecs.extend(wandio.plugins.load(wandio.plugins.CODEC_GROUP))
+    return True
+
+
+def magic_len():
+    """
+    Number of bytes needed to recognize any registered codec
+    """
+    lengths = [0]
+    for codec in _codecs:
+        if isinstance(codec.magic, tuple):
+            lengths.extend(len(magic) for magic in codec.magic)
+        elif codec.magic:
+            lengths.append(len(codec.magic))
+    return max(lengths)
+
+
+def find_by_filename(filename):
+    for codec in _codecs:
+        if filename.endswith(codec.suffixes):
+            return codec
+    if _load_plugins():
+        return find_by_filename(filename)
+    return None
+
+
+def find_by_magic(data):
+    _load_plugins()
+    for codec in _codecs:
+        if codec.magic and data.startswith(codec.magic):
+            return codec
+    return None
+
+
+def _gzip_reader(child, binary=False, index=None, **kwargs):
+    import wandio.compressed
+    return wandio.compressed.GzipReader(child, binary=binary, index=index)
+
+
+def _compression_options(options):
+    """
+    Get the compression settings from the options given to wandio.open:
+    "compresslevel" (for every codec), "strategy" and "memlevel" (for gzip)
+    and "high_water" (see CompressedWriter)
+    """
+    options = options or {}
+    return dict((key, options[key]) for key in
+                ["compresslevel", "strategy", "memlevel", "high_water"]
+                if options.get(key) is not None)
+
+
+def _gzip_writer(child, workers=1, block_size=None, options=None, **kwargs):
+    import wandio.compressed
+    opts = _compression_options(options)
+    if workers > 1:
+        opts.pop("high_water", None)
+        return wandio.compressed.ParallelGzipWriter(
+            child, workers,
+            block_size=block_size or wandio.compressed.DEFAULT_BLOCK_SIZE,
+            **opts)
+    return wandio.compressed.GzipWriter(child, **opts)
+
+
+def _bzip_reader(child, binary=False, workers=1, **kwargs):
+    import wandio.compressed
+    if workers > 1:
+        return wandio.compressed.ParallelBzipReader(child, workers,
+                                                    binary=binary)
+    return wandio.compressed.BzipReader(child, binary=binary)
+
+
+def _bzip_writer(child, workers=1, block_size=None, options=None, **kwargs):
+    import wandio.compressed
+    opts = _compression_options(options)
+    if workers > 1:
+        return wandio.compressed.ParallelBzipWriter(
+            child, workers,
+            block_size=block_size or wandio.compressed.DEFAULT_BLOCK_SIZE,
+            compresslevel=opts.get("compresslevel"))
+    return wandio.compressed.BzipWriter(
+        child, compresslevel=opts.get("compresslevel"),
+        high_water=opts.get("high_water",
+                            wandio.compressed.DEFAULT_HIGH_WATER))
+
+
+def _simple_reader(name):
+    def reader(child, binary=False, **kwargs):
+        import wandio.compressed
+        return getattr(wandio.compressed, name)(child, binary=binary)
+    return reader
+
+
+def _simple_writer(name):
+    def writer(child, options=None, **kwargs):
+        import wandio.compressed
+        opts = _compression_options(options)
+        cls = getattr(wandio.compressed, name)
+        return cls(child, compresslevel=opts.get("compresslevel"),
+                   high_water=opts.get("high_water",
+                                       wandio.compressed.DEFAULT_HIGH_WATER))
+    return writer
+
+
+# gzip: the ID bytes and the (only defined) deflate method
+register(Codec("gzip", [".gz"], b"\x1f\x8b\x08", _gzip_reader, _gzip_writer))
+# bzip2: "BZh", the block size, and either the magic number of the first
+# block or that of the end of an empty stream
+register(Codec("bzip2", [".bz2"],
+               tuple(b"BZh" + level + block
+                     for level in [b"%d" % i for i in range(1, 10)]
+                     for block in [b"1AY&SY", b"\x17rE8P\x90"]),
+               _bzip_reader, _bzip_writer))
+register(Codec("xz", [".xz", ".lzma"], b"\xfd7zXZ\x00",
+               _simple_reader("LzmaReader"), _simple_writer("LzmaWriter")))
+# zstd and lz4 support is only available if their packages are installed
+# (which we check for without importing them)
+if importlib.util.find_spec("zstandard") is not None:
+    register(Codec("zstd", [".zst"], b"\x28\xb5\x2f\xfd",
+                   _simple_reader("ZstdReader"), _simple_writer("ZstdWriter")))
+if importlib.util.find_spec("lz4") is not None:
+    register(Codec("lz4", [".lz4"], b"\x04\x22\x4d\x18",
+                   _simple_reader("Lz4Reader"), _simple_writer("Lz4Writer")))
@@ -1,126 +1,333 @@
+import bisect
 import bz2
+import collections
+import io
+import lzma
+import re
+import struct
 import zlib
 import wandio.file
+import wandio.stats
 
+# concurrent.futures, and the optional zstandard and lz4 packages, are
+# imported by the classes that need them, since they are slow to import
 
-class CompressedReader(wandio.file.GenericReader):
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+# amount of compressed data CompressedWriter collects before writing it out
+DEFAULT_HIGH_WATER = 64 * 1024
 
-    BUFLEN = 4096
+# the start of a bzip2 stream: "BZh", the block size, and the magic number
+# that starts the first block
+_BZIP_STREAM_RE = re.compile(b"BZh[1-9]\x31\x41\x59\x26\x53\x59")
+_BZIP_STREAM_HDR_LEN = 10
 
-    def __init__(self, child_reader, flush_dc):
+
+class GzipIndex(object):
+    """
+    In-memory index of decompressor checkpoints (in the style of zlib's
+    zran example) that allows seeking within a gzip file without
+    decompressing it from the start. The index is filled in by a
+    GzipReader as data is read, and may be passed to later readers of the
+    same file.
+
+    The checkpoints are copies of live zlib decompressors, so the index
+    only lasts as long as the process and can't be saved. (Saving it would
+    need each checkpoint's 32 KiB window and bit offset, and Python's zlib
+    can neither stop at deflate block boundaries nor resume mid-byte.)
+    """
+
+    DEFAULT_SPACING = 8 * 1024 * 1024
+
+    def __init__(self, spacing=DEFAULT_SPACING):
+        self.spacing = spacing
+        # (uncompressed offset, compressed offset, decompressor) tuples
+        self.points = []
+        self.offsets = []
+
+    def add(self, uoffset, coffset, dc):
+        if self.offsets and uoffset < self.offsets[-1] + self.spacing:
+            return
+        # the decompressor state includes its window, so a copy is all we
+        # need to resume decompression from this point
+        self.points.append((uoffset, coffset, dc.copy() if dc else None))
+        self.offsets.append(uoffset)
+
+    def find(self, offset):
+        """
+        Get the last checkpoint at or before the given uncompressed offset
+        """
+        idx = bisect.bisect_right(self.offsets, offset)
+        if not idx:
+            return None
+        return self.points[idx - 1]
+
+
+class CompressedReader(wandio.file.BlockReader):
+
+    MMAP_BUFLEN = 64 * 1024
+
+    def __init__(self, child_reader, flush_dc, binary=False, index=None):
         self.child_reader = child_reader
         self.flush_dc = flush_dc
+        self.index = index
         self.dc = None
         self.c_buf = b""
-        self.buf = b""
-        self.eof = False
-        self._refill()
-        super(CompressedReader, self).__init__(child_reader)
+        self.c_eof = False
+        # offsets of the next data to be read from the child reader, and of
+        # the next block of decompressed data
+        self.c_offset = 0
+        self.u_offset = 0
+        self.c_read = child_reader.read
+        self.c_buflen = self.BUFLEN
+        # memory-mapped files can hand us views of their data rather than
+        # copies, and since that's cheap we can take larger chunks of it
+        if hasattr(child_reader, "read_view"):
+            self.c_read = child_reader.read_view
+            self.c_buflen = self.MMAP_BUFLEN
+        super(CompressedReader, self).__init__(child_reader, binary=binary)
 
     def _get_dc(self):
         raise NotImplementedError
 
-    def _refill(self):
-        if self.eof:
-            return
-        # keep reading from the child reader until we've decompressed
-        # enough data to fill our buffer
-        while len(self.c_buf) or len(self.buf) < self.BUFLEN:
+    def _read_block(self):
+        stats = self.io_stats
+        # keep reading from the child reader until the decompressor gives
+        # us some data (or we run out of compressed data)
+        while len(self.c_buf) or not self.c_eof:
             if not len(self.c_buf):
+                if self.index is not None:
+                    self.index.add(self.u_offset, self.c_offset, self.dc)
                 # fill our buffer with compressed data
-                self.c_buf = self.child_reader.read(self.BUFLEN)
-                if len(self.c_buf) < self.BUFLEN:
-                    self.eof = True
+                if stats is None:
+                    self.c_buf = self.c_read(self.c_buflen)
+                else:
+                    self.c_buf = wandio.stats.timed(stats, "child_read",
+                                                    self.c_read, self.c_buflen)
+                    stats["bytes_in"] += len(self.c_buf)
+                self.c_offset += len(self.c_buf)
+                if len(self.c_buf) < self.c_buflen:
+                    self.c_eof = True
             # pass the compressed data to the decompressor, and get back
             # some decompressed data
             if self.dc is None:
                 self.dc = self._get_dc()
             # feed in the data in c_buf to decompress it
-            self.buf += self.dc.decompress(self.c_buf)
+            if stats is None:
+                block = self.dc.decompress(self.c_buf)
+            else:
+                block = wandio.stats.timed(stats, "decompress",
+                                           self.dc.decompress, self.c_buf)
             # if we are EOF on the child reader, then flush the decompressor
-            if self.eof and self.flush_dc:
-                self.buf += self.dc.flush()
-            self.c_buf = self.dc.unused_data
+            if self.c_eof and self.flush_dc:
+                block += self.dc.flush()
+            # (lz4 only sets unused_data once it reaches the end of a frame)
+            self.c_buf = self.dc.unused_data or b""
             if len(self.c_buf):
                 # we have leftover data after compression ended,
                 # so now we need a new decompressor
                 if self.flush_dc:
-                    self.buf += self.dc.flush()
+                    block += self.dc.flush()
                 self.dc = None
-            # only heed the eof once we've emptied c_buf
-            if not len(self.c_buf) and self.eof:
-                break
-
-    def read(self, size=None):
-        res = b""
-        while ((not self.eof) or len(self.buf)) and (size is None or len(res) < size):
-            if not len(self.buf):
-                self._refill()
-            toread = size-len(res) if size is not None else len(self.buf)
-            res += self.buf[0:toread]
-            self.buf = self.buf[toread:]
-        # TODO: remove these asserts
-        assert(size is None or len(res) <= size)
-        assert(size is None or len(res) == size or len(self.buf) == 0)
-        return res
-
-    def __next__(self):
-        line = self.readline()
-        if not line:
-            assert(not len(self.buf) and self.eof)
-            raise StopIteration
-        return line
-
-    def readline(self):
-        res = b""
-        while not len(res) or not res.endswith(b"\n"):
-            idx = self.buf.find(b"\n")
-            if idx == -1:
-                res += self.buf
-                self.buf = b""
-                self._refill()
-            else:
-                res += self.buf[0:idx+1]
-                self.buf = self.buf[idx+1:]
-            if not len(self.buf) and self.eof:
-                break
-        if not len(res) and not len(self.buf) and self.eof:
+            if len(block):
+                self.u_offset += len(block)
+                return block
+        return b""
+
+    def _seek_block(self, offset, end):
+        point = None
+        if self.index is not None:
+            point = self.index.find(offset)
+        if offset >= end and (point is None or point[0] <= end):
+            # reading on from where we are is at least as quick
             return None
-        return res.decode("utf-8")
+        if point is None:
+            raise io.UnsupportedOperation("seek requires an index")
+        (uoffset, coffset, dc) = point
+        self.child_reader.seek(coffset)
+        self.dc = dc.copy() if dc else None
+        self.c_buf = b""
+        self.c_eof = False
+        self.c_offset = coffset
+        self.u_offset = uoffset
+        return uoffset
 
 
 class CompressedWriter(wandio.file.GenericWriter):
+    """
+    Compresses data with a streaming compressor. The compressor's (often
+    tiny) outputs are collected until there are at least high_water bytes
+    of them, and then written to the child writer in one go.
+    """
 
-    def __init__(self, compressor, child_writer):
+    def __init__(self, compressor, child_writer,
+                 high_water=DEFAULT_HIGH_WATER):
         self.compressor = compressor
         self.child_writer = child_writer
+        self.high_water = high_water
+        self.out_buf = bytearray()
         super(CompressedWriter, self).__init__(child_writer)
 
+    def _output(self, cd):
+        if not len(cd):
+            return
+        if not len(self.out_buf) and len(cd) >= self.high_water:
+            # no need to copy large outputs into the buffer
+            self._write_child(cd)
+            return
+        self.out_buf += cd
+        if len(self.out_buf) >= self.high_water:
+            self._drain()
+
+    def _drain(self):
+        if len(self.out_buf):
+            self._write_child(bytes(self.out_buf))
+            del self.out_buf[:]
+
     def flush(self):
-        cd = self.compressor.flush()
-        self.fh.write(cd)
+        self._output(self.compressor.flush())
+        self._drain()
         self.fh.flush()
 
+    def _write_child(self, cd):
+        stats = self.io_stats
+        if stats is None:
+            self.fh.write(cd)
+        else:
+            wandio.stats.timed(stats, "child_write", self.fh.write, cd)
+            stats["bytes_out"] += len(cd)
+
     def write(self, data):
         if isinstance(data, str):
             data = data.encode()
-        cd = self.compressor.compress(data)
+        stats = self.io_stats
+        if stats is None:
+            cd = self.compressor.compress(data)
+        else:
+            cd = wandio.stats.timed(stats, "compress",
+                                    self.compressor.compress, data)
+            stats["bytes_in"] += len(data)
         # cd is partial compressed data
-        self.fh.write(cd)
+        self._output(cd)
 
     def writelines(self, lines):
+        # compress the lines in batches rather than one at a time
+        batch = []
+        size = 0
         for line in lines:
-            self.write(line)
+            if isinstance(line, str):
+                line = line.encode()
+            batch.append(line)
+            size += len(line)
+            if size >= self.high_water:
+                self.write(b"".join(batch))
+                batch = []
+                size = 0
+        if batch:
+            self.write(b"".join(batch))
 
     def close(self):
         self.flush()
         self.fh.close()
 
 
+class ParallelCompressedWriter(wandio.file.GenericWriter):
+    """
+    Splits the input into fixed-size blocks and compresses them
+    concurrently in a thread pool (zlib and bz2 release the GIL while
+    compressing), writing the compressed blocks out in order
+    """
+
+    def __init__(self, child_writer, workers, block_size=DEFAULT_BLOCK_SIZE):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.child_writer = child_writer
+        self.block_size = block_size
+        self.buf = bytearray()
+        self.prev_block = None
+        self.block_cnt = 0
+        # futures for blocks that have been submitted but not yet written,
+        # bounded so that we don't buffer the whole input in memory
+        self.pending = collections.deque()
+        self.max_pending = 2 * workers
+        import concurrent.futures
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        super(ParallelCompressedWriter, self).__init__(child_writer)
+        self.fh.write(self._header())
+
+    def _header(self):
+        return b""
+
+    def _trailer(self):
+        return b""
+
+    def _compress_block(self, block, prev_block):
+        # runs in a worker thread
+        raise NotImplementedError
+
+    def _submit(self, block):
+        self.pending.append(self.pool.submit(self._compress_block, block,
+                                             self.prev_block))
+        self.prev_block = block
+        self.block_cnt += 1
+        if self.io_stats is not None:
+            self.io_stats["bytes_in"] += len(block)
+            self.io_stats["blocks"] += 1
+        while len(self.pending) > self.max_pending:
+            self._write_next()
+
+    def _write_next(self):
+        stats = self.io_stats
+        if stats is None:
+            self.fh.write(self.pending.popleft().result())
+            return
+        # time spent waiting for the compressor threads
+        cd = wandio.stats.timed(stats, "compress_wait",
+                                self.pending.popleft().result)
+        wandio.stats.timed(stats, "child_write", self.fh.write, cd)
+        stats["bytes_out"] += len(cd)
+
+    def _drain(self):
+        while self.pending:
+            self._write_next()
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.buf += data
+        if len(self.buf) < self.block_size:
+            return
+        end = len(self.buf) - len(self.buf) % self.block_size
+        for off in range(0, end, self.block_size):
+            self._submit(bytes(self.buf[off:off+self.block_size]))
+        del self.buf[:end]
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        if len(self.buf):
+            self._submit(bytes(self.buf))
+            del self.buf[:]
+        self._drain()
+        self.fh.flush()
+
+    def close(self):
+        # always write at least one block so that empty files are valid
+        if len(self.buf) or not self.block_cnt:
+            self._submit(bytes(self.buf))
+            del self.buf[:]
+        self._drain()
+        self.pool.shutdown()
+        self.fh.write(self._trailer())
+        self.fh.close()
+
+
 class GzipReader(CompressedReader):
 
-    def __init__(self, child):
-        super(GzipReader, self).__init__(child, flush_dc=True)
+    def __init__(self, child, binary=False, index=None):
+        super(GzipReader, self).__init__(child, flush_dc=True, binary=binary,
+                                         index=index)
 
     def _get_dc(self):
         return zlib.decompressobj(16 + zlib.MAX_WBITS)
@@ -128,22 +335,277 @@ class GzipReader(CompressedReader):
 
 class GzipWriter(CompressedWriter):
 
-    def __init__(self, child):
-        compressor = zlib.compressobj(-1, zlib.DEFLATED, 16+zlib.MAX_WBITS)
-        super(GzipWriter, self).__init__(compressor, child)
+    def __init__(self, child, compresslevel=None,
+                 strategy=zlib.Z_DEFAULT_STRATEGY,
+                 memlevel=zlib.DEF_MEM_LEVEL, high_water=DEFAULT_HIGH_WATER):
+        """
+        :param compresslevel: zlib compression level (0-9, or -1 for the
+        default)
+        :param strategy: zlib strategy (e.g. zlib.Z_FILTERED)
+        :param memlevel: how much memory zlib uses for its internal state
+        (1-9)
+        :param high_water: see CompressedWriter
+        """
+        if compresslevel is None:
+            compresslevel = zlib.Z_DEFAULT_COMPRESSION
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED,
+                                      16+zlib.MAX_WBITS, memlevel, strategy)
+        super(GzipWriter, self).__init__(compressor, child,
+                                         high_water=high_water)
+
+
+class ParallelGzipWriter(ParallelCompressedWriter):
+    """
+    pigz-style parallel gzip compression: each block is compressed as raw
+    deflate data primed with the last 32 KiB of the previous block and
+    ended with a sync flush, so the output is a single gzip stream
+    """
+
+    # gzip header as written by zlib: no mtime, unix OS
+    HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\x03"
+    DICT_SIZE = 32 * 1024
+
+    def __init__(self, child, workers, block_size=DEFAULT_BLOCK_SIZE,
+                 compresslevel=None, strategy=zlib.Z_DEFAULT_STRATEGY,
+                 memlevel=zlib.DEF_MEM_LEVEL):
+        if compresslevel is None:
+            compresslevel = zlib.Z_DEFAULT_COMPRESSION
+        self.compresslevel = compresslevel
+        self.strategy = strategy
+        self.memlevel = memlevel
+        self.crc = 0
+        self.size = 0
+        super(ParallelGzipWriter, self).__init__(child, workers, block_size)
+
+    def _header(self):
+        return self.HEADER
+
+    def _submit(self, block):
+        # the checksum has to be computed in order
+        self.crc = zlib.crc32(block, self.crc)
+        self.size += len(block)
+        super(ParallelGzipWriter, self)._submit(block)
+
+    def _compress_block(self, block, prev_block):
+        if prev_block:
+            compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED,
+                                          -zlib.MAX_WBITS, self.memlevel,
+                                          self.strategy,
+                                          zdict=prev_block[-self.DICT_SIZE:])
+        else:
+            compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED,
+                                          -zlib.MAX_WBITS, self.memlevel,
+                                          self.strategy)
+        return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def _trailer(self):
+        # an empty final deflate block, followed by the gzip trailer
+        final = zlib.compressobj(self.compresslevel, zlib.DEFLATED,
+                                 -zlib.MAX_WBITS).flush()
+        return final + struct.pack("<II", self.crc & 0xffffffff,
+                                   self.size & 0xffffffff)
 
 
 class BzipReader(CompressedReader):
 
-    def __init__(self, child):
-        super(BzipReader, self).__init__(child, flush_dc=False)
+    def __init__(self, child, binary=False):
+        super(BzipReader, self).__init__(child, flush_dc=False, binary=binary)
 
     def _get_dc(self):
         return bz2.BZ2Decompressor()
 
 
+def _bzip_decompress_stream(data, last):
+    # runs in a worker thread
+    res = []
+    while True:
+        dc = bz2.BZ2Decompressor()
+        res.append(dc.decompress(data))
+        # empty streams have no block magic, so they aren't split off from
+        # the stream after them: carry on with whatever data is left over
+        data = dc.unused_data
+        if not dc.eof or not len(data):
+            break
+    # we split the input on what looked like the start of a stream, so if
+    # the data didn't end exactly at the end of a stream the magic number
+    # must have appeared inside compressed data
+    if not dc.eof and not last:
+        raise IOError("Could not split bzip2 data into streams")
+    return b"".join(res)
+
+
+class ParallelBzipReader(wandio.file.BlockReader):
+    """
+    Decompresses files made up of many bzip2 streams (e.g. written by
+    pbzip2 or ParallelBzipWriter) by finding the start of each stream and
+    decompressing the streams concurrently in a thread pool. Streams that
+    are larger than MAX_STREAM_SIZE are decompressed serially so that
+    memory use stays bounded.
+    """
+
+    CHUNK_SIZE = 256 * 1024
+    MAX_STREAM_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, child, workers, binary=False):
+        self.child_reader = child
+        self.c_eof = False
+        # futures for streams that have been submitted but not yet returned
+        self.pending = collections.deque()
+        self.max_pending = 2 * workers
+        import concurrent.futures
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.blocks = self._blocks()
+        super(ParallelBzipReader, self).__init__(child, binary=binary)
+
+    def _read_block(self):
+        return next(self.blocks, b"")
+
+    def _read_child(self):
+        data = self.child_reader.read(self.CHUNK_SIZE)
+        if not len(data):
+            self.c_eof = True
+        return data
+
+    def _blocks(self):
+        buf = bytearray()
+        # where to resume searching for the start of the next stream
+        scan = 1
+        while True:
+            while len(self.pending) < self.max_pending:
+                match = _BZIP_STREAM_RE.search(buf, scan)
+                if match is not None:
+                    self.pending.append(self.pool.submit(
+                        _bzip_decompress_stream, bytes(buf[:match.start()]),
+                        False))
+                    del buf[:match.start()]
+                    scan = 1
+                elif self.c_eof:
+                    if len(buf):
+                        self.pending.append(self.pool.submit(
+                            _bzip_decompress_stream, bytes(buf), True))
+                        del buf[:]
+                    break
+                elif len(buf) >= self.MAX_STREAM_SIZE:
+                    break
+                else:
+                    scan = max(1, len(buf) - _BZIP_STREAM_HDR_LEN + 1)
+                    buf += self._read_child()
+            if self.pending:
+                block = self.pending.popleft().result()
+                # (an empty block would look like EOF to BlockReader)
+                if len(block):
+                    yield block
+            elif len(buf):
+                # a single stream that is too large to decompress in one go
+                buf = yield from self._decompress_serially(buf)
+                scan = 1
+            else:
+                return
+
+    def _decompress_serially(self, buf):
+        dc = bz2.BZ2Decompressor()
+        data = bytes(buf)
+        while True:
+            res = dc.decompress(data)
+            if len(res):
+                yield res
+            if dc.eof:
+                return bytearray(dc.unused_data)
+            if self.c_eof:
+                return bytearray()
+            data = self._read_child()
+
+    def close(self):
+        for future in self.pending:
+            future.cancel()
+        self.pool.shutdown()
+        self.child_reader.close()
+
+
 class BzipWriter(CompressedWriter):
 
-    def __init__(self, child):
-        compressor = bz2.BZ2Compressor()
-        super(BzipWriter, self).__init__(compressor, child)
+    def __init__(self, child, compresslevel=None,
+                 high_water=DEFAULT_HIGH_WATER):
+        compressor = bz2.BZ2Compressor(compresslevel or 9)
+        super(BzipWriter, self).__init__(compressor, child,
+                                         high_water=high_water)
+
+
+class ParallelBzipWriter(ParallelCompressedWriter):
+    """
+    Parallel bzip2 compression: each block is compressed as an independent
+    bzip2 stream, and the streams are concatenated (as pbzip2 does)
+    """
+
+    def __init__(self, child, workers, block_size=DEFAULT_BLOCK_SIZE,
+                 compresslevel=None):
+        self.compresslevel = compresslevel or 9
+        super(ParallelBzipWriter, self).__init__(child, workers, block_size)
+
+    def _compress_block(self, block, prev_block):
+        return bz2.compress(block, self.compresslevel)
+
+
+class LzmaReader(CompressedReader):
+
+    def __init__(self, child, binary=False):
+        super(LzmaReader, self).__init__(child, flush_dc=False, binary=binary)
+
+    def _get_dc(self):
+        return lzma.LZMADecompressor()
+
+
+class LzmaWriter(CompressedWriter):
+
+    def __init__(self, child, compresslevel=None,
+                 high_water=DEFAULT_HIGH_WATER):
+        # the compression level is the xz preset
+        compressor = lzma.LZMACompressor(preset=compresslevel)
+        super(LzmaWriter, self).__init__(compressor, child,
+                                         high_water=high_water)
+
+
+class ZstdReader(CompressedReader):
+
+    def __init__(self, child, binary=False):
+        super(ZstdReader, self).__init__(child, flush_dc=False, binary=binary)
+
+    def _get_dc(self):
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj()
+
+
+class ZstdWriter(CompressedWriter):
+
+    def __init__(self, child, compresslevel=None,
+                 high_water=DEFAULT_HIGH_WATER):
+        import zstandard
+        if compresslevel is None:
+            compressor = zstandard.ZstdCompressor()
+        else:
+            compressor = zstandard.ZstdCompressor(level=compresslevel)
+        super(ZstdWriter, self).__init__(compressor.compressobj(), child,
+                                         high_water=high_water)
+
+
+class Lz4Reader(CompressedReader):
+
+    def __init__(self, child, binary=False):
+        super(Lz4Reader, self).__init__(child, flush_dc=False, binary=binary)
+
+    def _get_dc(self):
+        import lz4.frame
+        return lz4.frame.LZ4FrameDecompressor()
+
+
+class Lz4Writer(CompressedWriter):
+
+    def __init__(self, child, compresslevel=None,
+                 high_water=DEFAULT_HIGH_WATER):
+        import lz4.frame
+        compressor = lz4.frame.LZ4FrameCompressor(
+            compression_level=compresslevel or 0)
+        super(Lz4Writer, self).__init__(compressor, child,
+                                        high_water=high_water)
+        # unlike the other compressors, the frame header has to be asked for
+        self._output(compressor.begin())
@@ -1,6 +1,33 @@
+import codecs
+import collections
+import io
+import mmap
 import os
+import re
 import stat
+import struct
 import sys
+import time
+
+DEFAULT_RANGE_SIZE = 4 * 1024 * 1024
+DEFAULT_MAX_BUFFER = 64 * 1024 * 1024
+
+# used to split blocks that contain line separators other than "\n" (which
+# splitlines would also break on)
+_LINE_RE = re.compile(b"[^\n]*\n|[^\n]+$")
+_TEXT_LINE_RE = re.compile("[^\n]*\n|[^\n]+$")
+
+
+def _split_lines(block, newline, line_re):
+    lines = block.splitlines(True)
+    # splitlines is much faster than a regex, but also splits on "\r" etc.,
+    # which we can cheaply detect by comparing the number of lines
+    expected = block.count(newline)
+    if block and not block.endswith(newline):
+        expected += 1
+    if len(lines) != expected:
+        lines = line_re.findall(block)
+    return lines
 
 
 def file_stat(filename):
@@ -11,11 +38,29 @@ def file_stat(filename):
     }
 
 
+def time_to_first_byte(reader):
+    """
+    Get the time to first byte of a remote reader, which sets open_time when
+    it starts opening the file and first_byte_time when it (or the range
+    reader it wraps) receives the first data
+    """
+    first_byte_time = reader.first_byte_time
+    if first_byte_time is None:
+        first_byte_time = getattr(reader.fh, "first_byte_time", None)
+    if first_byte_time is None:
+        return None
+    return first_byte_time - reader.open_time
+
+
 class GenericReader(object):
     """
     Wraps a file-like object
     """
 
+    # counters kept by this layer, once statistics are being collected (see
+    # wandio.stats)
+    io_stats = None
+
     def __init__(self, fh):
         self.fh = fh
 
@@ -31,24 +76,542 @@ class GenericReader(object):
     def __next__(self):
         return next(self.fh)
 
-    def next(self):
-        return self.__next__()
-
     def read(self, *args):
         return self.fh.read(*args)
 
+    def readinto(self, b):
+        readinto = getattr(self.fh, "readinto", None)
+        if readinto is not None:
+            return readinto(b)
+        if isinstance(self.fh, io.TextIOBase):
+            # text can't be read into a byte buffer (and its encoded size
+            # may not fit in b), so callers have to use read instead
+            raise io.UnsupportedOperation("readinto")
+        # the wrapped object has no readinto, so fall back to read
+        data = self.fh.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
     def readline(self):
         return self.fh.readline()
 
+    def peek(self, size):
+        """
+        Return up to size bytes from the start of the unread data, without
+        consuming them (fewer bytes may be returned)
+        """
+        # text files can be peeked at through their binary buffer
+        fh = getattr(self.fh, "buffer", self.fh)
+        peek = getattr(fh, "peek", None)
+        if peek is None:
+            raise io.UnsupportedOperation("peek")
+        return peek(size)[:size]
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.fh.seek(offset, whence)
+
+    def tell(self):
+        return self.fh.tell()
+
+    def _records_reader(self, method):
+        # use the wrapped reader's own implementation if it has one,
+        # otherwise buffer the wrapped stream ourselves. The buffering
+        # reader then replaces the stream, so that data it has buffered
+        # isn't lost to later calls (read, readline, etc. go through it too).
+        func = getattr(self.fh, method, None)
+        if func is None:
+            self.fh = StreamReader(self.fh)
+            func = getattr(self.fh, method)
+        return func
+
+    def iter_chunks(self, size):
+        """
+        Yield the remaining data as bytes objects of size bytes (the last
+        one may be shorter)
+        """
+        return self._records_reader("iter_chunks")(size)
+
+    def iter_records(self, delimiter=b"\0", keepends=False):
+        """
+        Yield the delimiter-separated records in the remaining data as
+        bytes objects (with the delimiter if keepends is set)
+        """
+        return self._records_reader("iter_records")(delimiter, keepends)
+
+    def iter_length_prefixed(self, fmt="!I"):
+        """
+        Yield records that are each preceded by their length, encoded as a
+        struct with the given format (by default a 32-bit big-endian
+        unsigned integer)
+        """
+        return self._records_reader("iter_length_prefixed")(fmt)
+
     def close(self):
         self.fh.close()
 
 
+class BlockReader(GenericReader):
+    """
+    Base class for readers that produce their data a block at a time (e.g.
+    decompressors). Subclasses implement _read_block, and this class takes
+    care of buffering, line splitting and decoding.
+    """
+
+    BUFLEN = 4096
+    # minimum amount of data to split into lines at a time
+    LINE_BLOCK = 64 * 1024
+
+    def __init__(self, fh, binary=False):
+        self.binary = binary
+        # complete lines that have been split out of the buffer but not yet
+        # returned (bytes in binary mode, str otherwise)
+        self.lines = collections.deque()
+        # line_starts[n] is the offset of the first queued line when n lines
+        # are queued (worked out when tell is first called for a batch)
+        self.line_starts = None
+        self.decoder = None if binary else codecs.getincrementaldecoder("utf-8")()
+        # data that has not been consumed yet lives in buf[buf_pos:]; the
+        # consumed prefix is dropped lazily by _compact
+        self.buf = bytearray()
+        self.buf_pos = 0
+        # offset within the stream of buf[0]
+        self.buf_offset = 0
+        self.eof = False
+        # the buffer is filled lazily, on the first read
+        super(BlockReader, self).__init__(fh)
+
+    def _read_block(self):
+        """
+        Return the next block of data, or an empty bytes object at EOF
+        """
+        raise NotImplementedError
+
+    def _seek_block(self, offset, end):
+        """
+        Reposition the block source so that _read_block will return data
+        from an offset at or before the given offset, and return that
+        offset. end is the offset the source is currently at; return None
+        to carry on reading from there instead.
+        """
+        if offset >= end:
+            return None
+        raise io.UnsupportedOperation("seek")
+
+    def _buffered(self):
+        return len(self.buf) - self.buf_pos
+
+    def _compact(self):
+        # only move data once at least half of the buffer has been consumed
+        # so that the cost of the move is amortized over the consumed bytes
+        if self.buf_pos and self.buf_pos >= self._buffered():
+            del self.buf[:self.buf_pos]
+            self.buf_offset += self.buf_pos
+            self.buf_pos = 0
+
+    def _refill(self, want=None):
+        if self.eof:
+            return
+        self._compact()
+        want = self.BUFLEN if want is None else max(want, self.BUFLEN)
+        stats = self.io_stats
+        if stats is not None:
+            stats["refills"] += 1
+        while self._buffered() < want:
+            block = self._read_block()
+            if not len(block):
+                self.eof = True
+                break
+            self.buf += block
+            if stats is not None:
+                stats["blocks"] += 1
+                stats["bytes_out"] += len(block)
+
+    def _take(self, size):
+        # consume size bytes from the buffer, copying them exactly once
+        start = self.buf_pos
+        self.buf_pos += size
+        with memoryview(self.buf) as view:
+            return view[start:start+size].tobytes()
+
+    def _unqueue_lines(self):
+        # put lines that were split out for iteration back into the buffer
+        # so that read/readinto see them (only happens when mixing calls)
+        if self.binary:
+            data = b"".join(self.lines)
+        else:
+            data = "".join(self.lines).encode("utf-8")
+        self.lines.clear()
+        self.line_starts = None
+        self.buf[:self.buf_pos] = data
+        self.buf_offset += self.buf_pos - len(data)
+        self.buf_pos = 0
+
+    def _queue_lines(self):
+        # make sure there is at least one complete line in the buffer (or
+        # that we are at EOF), and that the block is reasonably large
+        while not self.eof and self._buffered() < self.LINE_BLOCK:
+            self._refill(self.LINE_BLOCK)
+        end = self.buf.rfind(b"\n", self.buf_pos) + 1
+        while not end and not self.eof:
+            self._refill(self._buffered() + self.LINE_BLOCK)
+            end = self.buf.rfind(b"\n", self.buf_pos) + 1
+        if not end or self.eof:
+            end = len(self.buf)
+        # the partial line at the end of the block stays in the buffer and
+        # will be completed by the next refill
+        block = self._take(end - self.buf_pos)
+        self.line_starts = None
+        if self.binary:
+            self.lines.extend(_split_lines(block, b"\n", _LINE_RE))
+        else:
+            block = self.decoder.decode(block, final=self.eof)
+            self.lines.extend(_split_lines(block, "\n", _TEXT_LINE_RE))
+
+    def read(self, size=None):
+        if self.lines:
+            self._unqueue_lines()
+        if size is None or size < 0:
+            while not self.eof:
+                self._refill(len(self.buf) * 2)
+            return self._take(self._buffered())
+        while self._buffered() < size and not self.eof:
+            self._refill(size)
+        return self._take(min(size, self._buffered()))
+
+    def readinto(self, b):
+        if self.lines:
+            self._unqueue_lines()
+        with memoryview(b) as out, out.cast("B") as out:
+            size = len(out)
+            while self._buffered() < size and not self.eof:
+                self._refill(size)
+            size = min(size, self._buffered())
+            with memoryview(self.buf) as view:
+                out[:size] = view[self.buf_pos:self.buf_pos+size]
+            self.buf_pos += size
+            return size
+
+    def peek(self, size):
+        if self.lines:
+            self._unqueue_lines()
+        while self._buffered() < size and not self.eof:
+            self._refill(size)
+        return bytes(self.buf[self.buf_pos:self.buf_pos+size])
+
+    def tell(self):
+        if self.lines:
+            return self._lines_tell()
+        return self.buf_offset + self.buf_pos
+
+    def _lines_tell(self):
+        # the queued lines end at the buffer position, so each line's
+        # offset can be found by working backwards from there (without
+        # putting them back into the buffer, which iterating would then
+        # have to split all over again)
+        if self.line_starts is None:
+            start = self.buf_offset + self.buf_pos
+            starts = [start]
+            for line in reversed(self.lines):
+                if self.binary:
+                    start -= len(line)
+                else:
+                    start -= len(line.encode("utf-8"))
+                starts.append(start)
+            self.line_starts = starts
+        return self.line_starts[len(self.lines)]
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.tell()
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("can only seek relative to the "
+                                          "start or current position")
+        if offset < 0:
+            raise ValueError("negative seek position %d" % offset)
+        if self.lines:
+            self._unqueue_lines()
+        if not self.buf_offset <= offset <= self.buf_offset + len(self.buf):
+            # the offset isn't buffered, so have the block source reposition
+            # itself (or carry on reading if we're seeking forward)
+            pos = self._seek_block(offset, self.buf_offset + len(self.buf))
+            if pos is not None:
+                self.buf = bytearray()
+                self.buf_pos = 0
+                self.buf_offset = pos
+                self.eof = False
+            # read and discard data up to the requested offset
+            while self.buf_offset + len(self.buf) < offset and not self.eof:
+                self.buf_pos = len(self.buf)
+                self._refill()
+        self.buf_pos = min(offset - self.buf_offset, len(self.buf))
+        if self.decoder is not None:
+            self.decoder.reset()
+        return self.buf_offset + self.buf_pos
+
+    def __iter__(self):
+        # a generator avoids the cost of a __next__ call for every line
+        lines = self.lines
+        while True:
+            while lines:
+                yield lines.popleft()
+            self._queue_lines()
+            if not lines:
+                return
+
+    def __next__(self):
+        if not self.lines:
+            self._queue_lines()
+            if not self.lines:
+                raise StopIteration
+        return self.lines.popleft()
+
+    def readline(self):
+        if self.lines:
+            return self.lines.popleft()
+        # offset (relative to buf_pos) where the newline search resumes, so
+        # that long lines spanning several refills are only scanned once
+        scanned = 0
+        while True:
+            idx = self.buf.find(b"\n", self.buf_pos + scanned)
+            if idx != -1:
+                size = idx + 1 - self.buf_pos
+                break
+            scanned = self._buffered()
+            if self.eof:
+                size = scanned
+                break
+            self._refill(scanned + self.BUFLEN)
+        if not size:
+            return None
+        line = self._take(size)
+        if self.binary:
+            return line
+        return line.decode("utf-8")
+
+    def _fill(self, size):
+        # make sure that size bytes are buffered (unless we reach EOF)
+        while self._buffered() < size and not self.eof:
+            self._refill(size)
+        return self._buffered() >= size
+
+    def iter_chunks(self, size):
+        if self.lines:
+            self._unqueue_lines()
+        while self._fill(size) or self._buffered():
+            yield self._take(min(size, self._buffered()))
+
+    def iter_records(self, delimiter=b"\0", keepends=False):
+        if self.lines:
+            self._unqueue_lines()
+        # offset (relative to buf_pos) where the delimiter search resumes
+        scanned = 0
+        while True:
+            idx = self.buf.find(delimiter, self.buf_pos + scanned)
+            if idx != -1:
+                size = idx - self.buf_pos
+                if keepends:
+                    size += len(delimiter)
+                record = self._take(size)
+                if not keepends:
+                    self.buf_pos += len(delimiter)
+                scanned = 0
+                yield record
+                continue
+            if self.eof:
+                if self._buffered():
+                    yield self._take(self._buffered())
+                return
+            # the delimiter may straddle the end of the buffered data
+            scanned = max(self._buffered() - len(delimiter) + 1, 0)
+            self._refill(self._buffered() + self.LINE_BLOCK)
+
+    def iter_length_prefixed(self, fmt="!I"):
+        if self.lines:
+            self._unqueue_lines()
+        header = struct.Struct(fmt)
+        while True:
+            if not self._fill(header.size):
+                if self._buffered():
+                    raise IOError("Truncated record header")
+                return
+            (size,) = header.unpack_from(self.buf, self.buf_pos)
+            if not self._fill(header.size + size):
+                raise IOError("Truncated record (expected %d bytes, got %d)"
+                              % (size, self._buffered() - header.size))
+            self.buf_pos += header.size
+            yield self._take(size)
+
+
+class StreamReader(BlockReader):
+    """
+    Buffers a stream that only has a read method (e.g. an HTTP response).
+    Text files are read through their binary buffer, and lines are decoded.
+    """
+
+    def __init__(self, fh):
+        self.stream = getattr(fh, "buffer", fh)
+        super(StreamReader, self).__init__(
+            fh, binary=not isinstance(fh, io.TextIOBase))
+        # offsets carry on from where the stream is (if it knows)
+        try:
+            self.buf_offset = self.stream.tell()
+        except (AttributeError, OSError):
+            pass
+
+    def _read_block(self):
+        return self.stream.read(self.LINE_BLOCK)
+
+    def _seek_block(self, offset, end):
+        seekable = getattr(self.stream, "seekable", None)
+        if seekable is not None and seekable():
+            return self.stream.seek(offset)
+        return super(StreamReader, self)._seek_block(offset, end)
+
+
+class RangeReader(BlockReader):
+    """
+    Base class for readers of remote objects of known size that fetch
+    byte ranges of the object concurrently and return them in order.
+    Subclasses implement _fetch_range.
+    """
+
+    def __init__(self, size, connections, range_size=DEFAULT_RANGE_SIZE,
+                 max_buffer=DEFAULT_MAX_BUFFER, limit=None):
+        """
+        :param limit: offset where reading will probably stop (e.g., the
+        end of a split), after which ranges are only fetched one at a time
+        as they're needed rather than ahead of time
+        """
+        self.size = size
+        self.limit = limit
+        self.range_size = range_size
+        # number of ranges that may be fetched (or fetched but not yet
+        # returned) at once, which keeps the memory they use under
+        # max_buffer (but always allows at least one)
+        self.max_pending = max(1, min(connections, max_buffer // range_size))
+        self.pending = collections.deque()
+        self.next_offset = 0
+        # time at which the first range was received
+        self.first_byte_time = None
+        # (imported here since it's slow to import, and rarely needed)
+        import concurrent.futures
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=connections)
+        super(RangeReader, self).__init__(None, binary=True)
+
+    def _fetch_range(self, start, end):
+        """
+        Return the bytes from start up to (but not including) end. This is
+        called from worker threads.
+        """
+        raise NotImplementedError
+
+    def _fetch(self, start, end):
+        data = self._fetch_range(start, end)
+        if len(data) != end - start:
+            raise IOError("Expected %d bytes for range %d-%d, got %d" %
+                          (end - start, start, end - 1, len(data)))
+        return data
+
+    def _read_block(self):
+        while len(self.pending) < self.max_pending and \
+                self.next_offset < self.size and \
+                (self.limit is None or self.next_offset < self.limit or
+                 not self.pending):
+            end = min(self.next_offset + self.range_size, self.size)
+            self.pending.append(self.pool.submit(self._fetch,
+                                                 self.next_offset, end))
+            self.next_offset = end
+        if not self.pending:
+            return b""
+        block = self.pending.popleft().result()
+        if self.first_byte_time is None:
+            self.first_byte_time = time.time()
+        return block
+
+    def _cancel(self):
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+
+    def _seek_block(self, offset, end):
+        if end <= offset < self.next_offset:
+            # the range is already being fetched
+            return None
+        self._cancel()
+        self.next_offset = min(offset - offset % self.range_size, self.size)
+        return self.next_offset
+
+    def close(self):
+        self._cancel()
+        # don't wait for ranges that are already being fetched
+        self.pool.shutdown(wait=False)
+
+
+class LineRangeReader(BlockReader):
+    """
+    Reads the lines of a file that start between two byte offsets, so that
+    readers of consecutive ranges (e.g., from wandio.plan_splits) together
+    read every line of the file exactly once: a line that crosses the end
+    of the range is read to its end, and one that crosses the start is left
+    to the reader of the previous range. The binary reader given must be
+    positioned at start - 1 (or at 0, if start is 0), so that we can tell
+    whether a line starts at start.
+    """
+
+    def __init__(self, fh, start, end=None, binary=False):
+        """
+        :param fh: binary reader, positioned as above
+        :param start: offset of the start of the range
+        :param end: offset of the end of the range (None to read to EOF)
+        """
+        self.start = start
+        self.end = end
+        # offset of the next data read from fh
+        self.offset = max(start - 1, 0)
+        # skipping the (partial) line before the first line boundary?
+        self.skipping = start > 0
+        self.done = end is not None and end <= start
+        super(LineRangeReader, self).__init__(fh, binary=binary)
+
+    def _read_block(self):
+        while not self.done:
+            block = self.fh.read(self.LINE_BLOCK)
+            if not len(block):
+                break
+            block_offset = self.offset
+            self.offset += len(block)
+            if self.skipping:
+                idx = block.find(b"\n")
+                if idx == -1:
+                    continue
+                block = block[idx+1:]
+                block_offset += idx + 1
+                self.skipping = False
+                if self.end is not None and block_offset >= self.end:
+                    # the first line starts after the end of the range
+                    break
+            if self.end is None:
+                return block
+            # stop after the line that the end of the range falls in
+            idx = block.find(b"\n", max(self.end - 1 - block_offset, 0))
+            if idx != -1:
+                block = block[:idx+1]
+                self.done = True
+            if len(block):
+                return block
+        self.done = True
+        return b""
+
+
 class GenericWriter(object):
     """
     Wraps a file-like writer object
     """
 
+    # see GenericReader.io_stats
+    io_stats = None
+
     def __init__(self, fh):
         self.fh = fh
 
@@ -71,21 +634,235 @@ class GenericWriter(object):
         self.fh.close()
 
 
-class StdinReader(GenericReader):
+class TransportReader(GenericReader):
+    """
+    Base class for readers that get data from a file, URL, etc., which count
+    the bytes they return once statistics are being collected
+    """
 
-    def __init__(self):
-        super(StdinReader, self).__init__(sys.stdin)
+    def _count(self, data):
+        if self.io_stats is not None and data:
+            self.io_stats["bytes"] += len(data)
+        return data
 
+    def read(self, *args):
+        return self._count(self.fh.read(*args))
 
-class SimpleReader(GenericReader):
+    def readinto(self, b):
+        n = super(TransportReader, self).readinto(b)
+        if self.io_stats is not None:
+            self.io_stats["bytes"] += n
+        return n
+
+    def readline(self):
+        return self._count(self.fh.readline())
+
+    def __next__(self):
+        return self._count(next(self.fh))
+
+
+class StdinReader(TransportReader):
+
+    def __init__(self, mode="r"):
+        assert mode in ["r", "rb"]
+        fh = sys.stdin
+        if mode == "rb" and hasattr(fh, "buffer"):
+            fh = fh.buffer
+        super(StdinReader, self).__init__(fh)
+
+
+class SimpleReader(TransportReader):
 
     def __init__(self, filename, mode="r"):
         assert mode in ["r", "rb"]
         super(SimpleReader, self).__init__(open(filename, mode))
 
 
+class MmapReader(TransportReader):
+    """
+    Reads a regular local file through a read-only memory mapping. read and
+    readline slice the mapping directly, and read_view hands out
+    memoryview slices of it (which decompressors can use without copying).
+    Only binary mode is supported: text mode is left to open(), which
+    decodes and translates newlines incrementally.
+    """
+
+    def __init__(self, filename, mode="rb"):
+        assert mode == "rb"
+        with open(filename, "rb") as f:
+            # the mapping stays valid once the file is closed
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # ask the kernel for aggressive read-ahead
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if hasattr(self.map, "madvise"):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+        self.view = memoryview(self.map)
+        super(MmapReader, self).__init__(self.map)
+
+    @staticmethod
+    def can_map(filename):
+        """
+        Check whether the given file can be memory mapped (i.e. that it's a
+        non-empty regular file rather than a pipe, device, etc.)
+        """
+        try:
+            sr = os.stat(filename)
+        except OSError:
+            return False
+        return stat.S_ISREG(sr.st_mode) and sr.st_size > 0
+
+    def __iter__(self):
+        lines = iter(self.map.readline, b"")
+        if self.io_stats is None:
+            return lines
+        return (self._count(line) for line in lines)
+
+    def __next__(self):
+        line = self.map.readline()
+        if not line:
+            raise StopIteration
+        return self._count(line)
+
+    def read(self, size=None):
+        if size is None or size < 0:
+            return self._count(self.map.read())
+        return self._count(self.map.read(size))
+
+    def read_view(self, size):
+        """
+        Consume up to size bytes and return them as a memoryview of the
+        mapping (without copying)
+        """
+        pos = self.map.tell()
+        data = self.view[pos:pos+size]
+        self.map.seek(pos + len(data))
+        return self._count(data)
+
+    def readinto(self, b):
+        with memoryview(b) as out, out.cast("B") as out:
+            data = self.read_view(len(out))
+            out[:len(data)] = data
+            return len(data)
+
+    def readline(self):
+        return self._count(self.map.readline())
+
+    def peek(self, size):
+        pos = self.map.tell()
+        return self.map[pos:pos+size]
+
+    def iter_chunks(self, size):
+        return iter(lambda: self._count(self.map.read(size)), b"")
+
+    def iter_records(self, delimiter=b"\0", keepends=False):
+        m = self.map
+        while True:
+            pos = m.tell()
+            if pos >= len(m):
+                return
+            idx = m.find(delimiter, pos)
+            if idx == -1:
+                yield self._count(m.read())
+                return
+            if keepends:
+                yield self._count(m.read(idx + len(delimiter) - pos))
+            else:
+                yield self._count(m.read(idx - pos))
+                m.seek(len(delimiter), io.SEEK_CUR)
+
+    def iter_length_prefixed(self, fmt="!I"):
+        header = struct.Struct(fmt)
+        m = self.map
+        while True:
+            pos = m.tell()
+            if pos >= len(m):
+                return
+            if pos + header.size > len(m):
+                raise IOError("Truncated record header")
+            (size,) = header.unpack_from(m, pos)
+            if pos + header.size + size > len(m):
+                raise IOError("Truncated record (expected %d bytes, got %d)"
+                              % (size, len(m) - pos - header.size))
+            m.seek(header.size, io.SEEK_CUR)
+            yield self._count(m.read(size))
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.map.seek(offset, whence)
+        return self.map.tell()
+
+    def close(self):
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # a decompressor still holds a view of the mapping; it will be
+            # unmapped once that is garbage collected
+            pass
+
+
 class SimpleWriter(GenericWriter):
 
     def __init__(self, filename, mode="w"):
         assert mode in ["w", "wb"]
         super(SimpleWriter, self).__init__(open(filename, mode))
+
+
+class AtomicFileWriter(GenericWriter):
+    """
+    Writes to a temporary file in the same directory as the file, which
+    only replaces the file once it has been written completely (see
+    prepare and commit)
+    """
+
+    def __init__(self, filename, mode="w"):
+        assert mode in ["w", "wb"]
+        self.filename = filename
+        (dirname, basename) = os.path.split(filename)
+        # (unlike mkstemp, this creates the file with the usual permissions)
+        self.tmp_path = os.path.join(dirname, ".%s.%s.tmp" % (
+            basename, codecs.encode(os.urandom(6), "hex").decode()))
+        fd = os.open(self.tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                     0o666)
+        self.done = False
+        super(AtomicFileWriter, self).__init__(os.fdopen(fd, mode))
+
+    def prepare(self):
+        """
+        Make sure that everything written so far is on disk
+        """
+        if not self.fh.closed:
+            self.fh.flush()
+            os.fsync(self.fh.fileno())
+            self.fh.close()
+
+    def commit(self):
+        """
+        Replace the file with the temporary file, once prepare has been
+        called
+        """
+        os.rename(self.tmp_path, self.filename)
+        self.done = True
+
+    def abort(self):
+        """
+        Remove the temporary file, leaving the file as it was
+        """
+        if self.done:
+            return
+        self.done = True
+        self.fh.close()
+        try:
+            os.unlink(self.tmp_path)
+        except OSError:
+            pass
+
+    def close(self):
+        if self.done:
+            return
+        try:
+            self.prepare()
+            self.commit()
+        except BaseException:
+            self.abort()
+            raise
@@ -1,141 +1,654 @@
 #!/usr/bin/env python
 
 import argparse
-import os, sys, errno
-import shutil
-import socket
-
-# urllib import compatible with both python2 and python3
-# https://python-future.org/compatible_idioms.html#urllib-module
-try:
-    from urllib.parse import urlparse
-except ImportError:
-    from urlparse import urlparse
-
-import wandio.compressed
+import collections
+import io
+import os, sys
+
+# transports and codecs import their modules (e.g. swiftclient) when they
+# are first used, so that importing wandio stays cheap
+import wandio.codec
 import wandio.file
-import wandio.wand_http
-import wandio.swift
+import wandio.stats
+import wandio.tee
+import wandio.threaded
+import wandio.transport
+
+DEFAULT_STAT_CONCURRENCY = 16
 
 
 class Reader(wandio.file.GenericReader):
 
-    def __init__(self, filename, mode="r", options=None):
+    def __init__(self, filename, mode="r", options=None, threaded=False,
+                 queue_depth=wandio.threaded.DEFAULT_QUEUE_DEPTH, workers=1,
+                 index=None, connections=1,
+                 range_size=wandio.file.DEFAULT_RANGE_SIZE,
+                 max_buffer=wandio.file.DEFAULT_MAX_BUFFER, cache=None,
+                 stats=False, stats_callback=None, byte_range=None):
         self.filename = filename
-
-        # check for the transport types first (HTTP, Swift, Simple)
-
-        # is this Swift
-        if filename.startswith("swift://"):
-            fh = wandio.swift.SwiftReader(self.filename, options=options)
-
-        # is this simple HTTP ?
-        elif urlparse(self.filename).netloc:
-            fh = wandio.wand_http.HttpReader(self.filename)
-
-        # stdin?
-        elif filename == "-":
-            fh = wandio.file.StdinReader()
-
-        # then it must be a simple local file
+        self._stats = None
+        if stats or stats_callback is not None:
+            self._stats = wandio.stats.Stats(filename, stats_callback)
+        binary = mode == "rb"
+        # the threaded reader does its own decoding, so it needs bytes
+        if threaded:
+            mode = "rb"
+
+        # check the encoding type (gzip, bzip, plain, ...) based on the
+        # file name first, so that the transport can be opened in the right
+        # mode (if this fails, the magic bytes are checked below)
+        codec = wandio.codec.find_by_filename(filename)
+        if codec is not None:
+            mode = "rb"
+
+        # only read the lines that start within the given byte range (of
+        # the decompressed data, for compressed files)
+        transport_range = None
+        if byte_range is not None:
+            (start, end) = byte_range
+            if start < 0 or (end is not None and end < start):
+                raise ValueError("Invalid byte range %r" % (byte_range,))
+            # start reading from the byte before the range, to see whether
+            # a line starts at the start of the range
+            pos = max(start - 1, 0)
+            mode = "rb"
+            # compressed files are decompressed from the start (or from the
+            # closest index point) and then skipped through
+            if codec is None:
+                transport_range = (pos, end)
+
+        # find the transport (local file, stdin, HTTP, Swift, ...) for the
+        # file name's URL scheme
+        transport = wandio.transport.find(filename)
+
+        # local file to read from (possibly a cached copy of a remote file)
+        path = None
+        # validator of the remote file, if it is to be added to the cache
+        validator = None
+        if cache is not None and transport.remote:
+            (path, validator) = cache.lookup(self.filename, options=options)
+
+        if path is not None:
+            fh = self._open_local(path, mode, byte_range=transport_range)
         else:
-            # default reading as binary mode for .gz and .bz2 files
-            if filename.endswith(".gz") or filename.endswith(".bz2"):
-                mode = "rb"
-            fh = wandio.file.SimpleReader(self.filename, mode=mode)
+            if transport.name == "file":
+                path = self.filename
+            fh = transport.reader(self.filename, mode=mode, options=options,
+                                  connections=connections,
+                                  range_size=range_size,
+                                  max_buffer=max_buffer,
+                                  byte_range=transport_range)
+
+        # store the remote file in the cache as it is read (unless we're
+        # only reading part of it)
+        if path is None and validator is not None and byte_range is None:
+            fh = cache.fill(self.filename, validator, fh, binary=mode == "rb")
 
         assert fh
 
-        # now check the encoding types (gzip, bzip, plain)
+        # no codec matched the file name, so peek at the data (without
+        # consuming it) to see if it starts with any codec's magic bytes
+        # (which only works if we're reading from the start)
+        if codec is None and byte_range is None:
+            try:
+                codec = wandio.codec.find_by_magic(
+                    fh.peek(wandio.codec.magic_len()))
+            except io.UnsupportedOperation:
+                pass
+            # compressed data has to be read in binary mode
+            if codec is not None and mode != "rb":
+                if isinstance(fh, wandio.file.StdinReader):
+                    fh = wandio.file.StdinReader(mode="rb")
+                elif path is not None:
+                    fh.close()
+                    fh = self._open_local(path, "rb")
+
+        # wrap the transport with the decoder for its encoding
+        if codec is not None:
+            fh = codec.reader(fh, binary=binary or byte_range is not None,
+                              workers=workers, index=index)
+            if byte_range is not None:
+                fh.seek(pos)
+
+        if byte_range is not None:
+            fh = wandio.file.LineRangeReader(fh, start, end,
+                                             binary=binary or threaded)
+
+        # the layers have to be instrumented before the background thread
+        # starts reading from them
+        if self._stats is not None:
+            self._stats.attach(fh)
+
+        # read (and decompress) in a background thread?
+        if threaded:
+            fh = wandio.threaded.ThreadedReader(fh, queue_depth=queue_depth,
+                                                binary=binary)
+
+        if self._stats is not None:
+            fh = wandio.stats.StatsReader(fh)
+            self._stats.attach(fh)
 
-        # Gzip?
-        if filename.endswith(".gz"):
-            fh = wandio.compressed.GzipReader(fh)
+        super(Reader, self).__init__(fh)
 
-        # Bzip2?
-        elif filename.endswith(".bz2"):
-            fh = wandio.compressed.BzipReader(fh)
+    def stats(self):
+        """
+        Get the I/O statistics of this reader (see wandio.stats.Stats), or
+        None if it was not opened with stats or stats_callback
+        """
+        if self._stats is None:
+            return None
+        return self._stats.snapshot()
 
-        # Plain, leave the transport handle as-is
-        else:
-            pass
+    @staticmethod
+    def _open_local(path, mode, byte_range=None):
+        return wandio.transport.find(path).reader(path, mode=mode,
+                                                  byte_range=byte_range)
 
-        super(Reader, self).__init__(fh)
+    def __iter__(self):
+        # iterate the underlying reader directly rather than going through
+        # our own __next__ for every line
+        return iter(self.fh)
+
+    def close(self):
+        super(Reader, self).close()
+        if self._stats is not None:
+            self._stats.close()
 
 
 # TODO: refactor Reader and Writer
 class Writer(wandio.file.GenericWriter):
 
-    def __init__(self, filename, mode="w", options=None):
+    def __init__(self, filename, mode="w", options=None, workers=1,
+                 block_size=None, stats=False, stats_callback=None,
+                 on_error=wandio.tee.ON_ERROR_ABORT,
+                 queue_depth=wandio.tee.DEFAULT_QUEUE_DEPTH):
+        """
+        :param filename: file to write, or a list of files to write the same
+        data to (see wandio.tee.TeeWriter, to which on_error and queue_depth
+        are passed). The data is only compressed once, so the files must
+        all have the same encoding.
+        """
         self.filename = filename
-
-        is_binary_file = True if filename.endswith(".gz") or filename.endswith(".bz2") else False
-
-        # check for the transport types first (HTTP, Swift, Simple)
-        # is this Swift
-        if filename.startswith("swift://"):
-            fh = wandio.swift.SwiftWriter(self.filename, options=options, use_bytes_io=is_binary_file)
-
-        # is this simple HTTP ?
-        elif urlparse(self.filename).netloc:
-            raise NotImplementedError("Writing to HTTP is not supported")
-
-        # then it must be a simple local file
+        self._tee = None
+        filenames = None
+        if isinstance(filename, (list, tuple)):
+            filenames = list(filename)
+            if not filenames:
+                raise ValueError("No files to write to")
+            filename = filenames[0]
+        self._stats = None
+        if stats or stats_callback is not None:
+            self._stats = wandio.stats.Stats(
+                filename if filenames is None else ", ".join(filenames),
+                stats_callback)
+
+        codec = wandio.codec.find_by_filename(filename)
+        is_binary_file = codec is not None
+
+        if filenames is None:
+            # open the transport (HTTP, Swift, Simple) for the file name
+            fh = wandio.transport.find(filename).writer(
+                filename, mode=mode, options=options, binary=is_binary_file)
         else:
-            if is_binary_file:
-                mode = "wb"
-            fh = wandio.file.SimpleWriter(self.filename, mode=mode)
+            if any(wandio.codec.find_by_filename(other) is not codec
+                   for other in filenames):
+                raise ValueError("Files written together must all have the "
+                                 "same encoding")
+            fh = self._tee = self._open_tee(filenames, options, on_error,
+                                            queue_depth)
 
         assert fh
 
-        # now check the encoding types (gzip, bzip, plain)
+        # now wrap the transport with the encoder for the file type (if any)
+        if codec is not None:
+            fh = codec.writer(fh, workers=workers, block_size=block_size,
+                              options=options)
 
-        # Gzip?
-        if filename.endswith(".gz"):
-            fh = wandio.compressed.GzipWriter(fh)
+        if self._stats is not None:
+            fh = wandio.stats.StatsWriter(fh)
+            self._stats.attach(fh)
 
-        # Bzip2?
-        elif filename.endswith(".bz2"):
-            fh = wandio.compressed.BzipWriter(fh)
+        super(Writer, self).__init__(fh)
 
-        # Plain, leave the transport handle as-is
+    @staticmethod
+    def _open_tee(filenames, options, on_error, queue_depth):
+        writers = []
+        names = []
+        # file name -> exception, for files that couldn't be opened
+        errors = {}
+        try:
+            for filename in filenames:
+                # the files only appear once they have been written
+                # completely
+                try:
+                    writers.append(wandio.transport.find(filename).writer(
+                        filename, mode="wb", options=options, binary=True,
+                        atomic=True))
+                except Exception as e:
+                    if on_error != wandio.tee.ON_ERROR_DROP:
+                        raise
+                    errors[filename] = e
+                    continue
+                names.append(filename)
+            if not writers:
+                # (there is at least one file, so at least one error)
+                raise errors[filenames[0]]
+        except BaseException:
+            for writer in writers:
+                if hasattr(writer, "abort"):
+                    writer.abort()
+            raise
+        tee = wandio.tee.TeeWriter(writers, names=names, on_error=on_error,
+                                   queue_depth=queue_depth)
+        tee.errors.update(errors)
+        return tee
+
+    def stats(self):
+        """
+        Get the I/O statistics of this writer (see Reader.stats)
+        """
+        if self._stats is None:
+            return None
+        return self._stats.snapshot()
+
+    def errors(self):
+        """
+        Get the errors of the files that could not be written, when writing
+        to several files with on_error="drop" (as a dict keyed by file name)
+        """
+        if self._tee is None:
+            return {}
+        return dict(self._tee.errors)
+
+    def abort(self):
+        """
+        Stop writing to several files, without creating any of them
+        """
+        if self._tee is None:
+            raise io.UnsupportedOperation("only writers of several files "
+                                          "can be aborted")
+        self._tee.abort()
+        if self._stats is not None:
+            self._stats.close()
+
+    def __exit__(self, type, value, traceback):
+        if type is not None and self._tee is not None:
+            # don't commit incomplete data
+            self.abort()
         else:
-            pass
+            self.close()
 
-        super(Writer, self).__init__(fh)
+    def close(self):
+        try:
+            super(Writer, self).close()
+        except BaseException:
+            if self._tee is not None:
+                self._tee.abort()
+            raise
+        finally:
+            if self._stats is not None:
+                self._stats.close()
 
 
-def wandio_open(filename, mode="r", options=None):
+def wandio_open(filename, mode="r", options=None, **kwargs):
     if mode in ["r", "rb"]:
-        return Reader(filename, mode, options)
+        return Reader(filename, mode, options, **kwargs)
     elif mode in ["w", "wb"]:
-        return Writer(filename, mode, options)
+        return Writer(filename, mode, options, **kwargs)
     else:
         raise ValueError("Invalid mode. Mode must be either 'r'/'rb' or 'w'/'wb'")
 
 
-def wandio_stat(filename):
+class MultiReader(object):
+    """
+    Reads several files one after the other as a single stream of lines or
+    data. While one file is being read, the next prefetch files are opened
+    (and their first block read) in background threads, so that connection
+    setup, authentication and decompression of the first block aren't on
+    the critical path.
+    """
+
+    def __init__(self, filenames, mode="r", options=None, prefetch=2,
+                 with_filename=False, on_error=None, **kwargs):
+        """
+        :param filenames: files to read, in order
+        :param mode: "r" or "rb"
+        :param options: options passed to each Reader
+        :param prefetch: number of files to open ahead of the current one
+        :param with_filename: iterate over (filename, line) tuples rather
+        than lines
+        :param on_error: if given, called as on_error(filename, exception)
+        for files that can't be opened, which are then skipped (otherwise
+        the exception is raised)
+        :param kwargs: other Reader options
+        """
+        if mode not in ["r", "rb"]:
+            raise ValueError("Invalid mode. Mode must be either 'r' or 'rb'")
+        self.filenames = iter(filenames)
+        self.mode = mode
+        self.options = options
+        self.prefetch = prefetch
+        self.with_filename = with_filename
+        self.on_error = on_error
+        self.kwargs = kwargs
+        self.empty = b"" if mode == "rb" else ""
+        # (filename, future) for files being opened
+        self.pending = collections.deque()
+        import concurrent.futures
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(prefetch, 1))
+        # the file being read, and its name
+        self.fh = None
+        self.filename = None
+        self._schedule(self.prefetch)
+
+    def _open(self, filename):
+        fh = Reader(filename, self.mode, self.options, **self.kwargs)
+        try:
+            # read (and decompress) the first block so that it's ready
+            fh.peek(1)
+        except io.UnsupportedOperation:
+            pass
+        return fh
+
+    def _schedule(self, count):
+        while len(self.pending) < count:
+            filename = next(self.filenames, None)
+            if filename is None:
+                return
+            self.pending.append((filename,
+                                 self.pool.submit(self._open, filename)))
+
+    def _advance(self):
+        """
+        Move on to the next file (if the current one is finished), and
+        return False once all files have been read
+        """
+        if self.fh is not None:
+            return True
+        while True:
+            # make sure that at least the next file is being opened
+            self._schedule(max(self.prefetch, 1))
+            if not self.pending:
+                return False
+            (filename, future) = self.pending.popleft()
+            self._schedule(self.prefetch)
+            try:
+                self.fh = future.result()
+            except Exception as e:
+                if self.on_error is None:
+                    raise
+                self.on_error(filename, e)
+                continue
+            self.filename = filename
+            return True
+
+    def _finish(self):
+        self.fh.close()
+        self.fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __iter__(self):
+        while self._advance():
+            if self.with_filename:
+                filename = self.filename
+                for line in self.fh:
+                    yield filename, line
+            else:
+                for line in self.fh:
+                    yield line
+            self._finish()
+
+    def read(self, size=-1):
+        chunks = []
+        while size and self._advance():
+            data = self.fh.read() if size < 0 else self.fh.read(size)
+            if not data:
+                self._finish()
+                continue
+            chunks.append(data)
+            if size > 0:
+                size -= len(data)
+        return self.empty.join(chunks)
+
+    def readinto(self, b):
+        while self._advance():
+            n = self.fh.readinto(b)
+            if n:
+                return n
+            self._finish()
+        return 0
+
+    def readline(self):
+        while self._advance():
+            line = self.fh.readline()
+            if line:
+                return line
+            self._finish()
+        return self.empty
+
+    def _iter_files(self, method, *args):
+        # records don't span files
+        while self._advance():
+            for record in getattr(self.fh, method)(*args):
+                yield record
+            self._finish()
+
+    def iter_chunks(self, size):
+        return self._iter_files("iter_chunks", size)
+
+    def iter_records(self, delimiter=b"\0", keepends=False):
+        return self._iter_files("iter_records", delimiter, keepends)
+
+    def iter_length_prefixed(self, fmt="!I"):
+        return self._iter_files("iter_length_prefixed", fmt)
+
+    def close(self):
+        if self.fh is not None:
+            self._finish()
+        # files that are still being opened are closed once they are
+        while self.pending:
+            (_, future) = self.pending.popleft()
+            if not future.cancel():
+                future.add_done_callback(_close_opened)
+        self.pool.shutdown(wait=False)
+
+
+def _close_opened(future):
+    if future.exception() is None:
+        future.result().close()
+
+
+def open_many(filenames, mode="r", options=None, prefetch=2, **kwargs):
+    """
+    Open several files to be read one after the other as a single stream
+    (see MultiReader)
+    """
+    return MultiReader(filenames, mode=mode, options=options,
+                       prefetch=prefetch, **kwargs)
+
+
+def wandio_stat(filename, options=None):
     # currently we support a *very* limited set stat fields:
     # - mtime (Last-Modified for HTTP)
     # - size
-    # is this Swift
-    if filename.startswith("swift://"):
-        # TODO
-        raise NotImplementedError("Stat not yet supported for Swift files")
-
-    # is this simple HTTP ?
-    elif urlparse(filename).netloc:
-        statfunc = wandio.wand_http.http_stat
-
-    # stdin?
-    elif filename == "-":
-        raise NotImplementedError("Cannot perform stat operation on STDIN")
-
-    # then it must be a simple local file
+    return wandio.transport.find(filename).stat(filename, options=options)
+
+
+def stat_many(filenames, options=None, concurrency=DEFAULT_STAT_CONCURRENCY):
+    """
+    Stat several files at once. Files are stat'ed concurrently by up to
+    concurrency threads, except for Swift objects, which are stat'ed in
+    bulk (one request to the Swift service per container).
+    :param filenames: files (local paths or URLs) to stat
+    :param options: options passed to each stat
+    :param concurrency: number of files to stat at a time
+    :return: list with the stat dict of each file (see wandio.stat), in the
+    order the files were given, or the exception raised when stat'ing the
+    file in its place
+    """
+    import concurrent.futures
+    filenames = list(filenames)
+    if any(wandio.transport.get_scheme(filename) == "swift"
+           for filename in filenames):
+        # (imported here since swiftclient is optional)
+        from wandio import swift
+    results = [None] * len(filenames)
+    # container -> [(index, object name)]
+    swift_objects = collections.OrderedDict()
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(concurrency, 1)) as pool:
+        singles = []
+        for (idx, filename) in enumerate(filenames):
+            if wandio.transport.get_scheme(filename) == "swift":
+                try:
+                    parsed_url = swift.parse_url(filename)
+                except ValueError as e:
+                    results[idx] = e
+                    continue
+                swift_objects.setdefault(parsed_url["container"], []).append(
+                    (idx, parsed_url["obj"]))
+            else:
+                singles.append((idx, pool.submit(wandio_stat, filename,
+                                                 options)))
+        bulk = []
+        for (container, items) in swift_objects.items():
+            # each object only needs to be stat'ed once
+            objects = list(collections.OrderedDict.fromkeys(
+                obj for (_, obj) in items))
+            bulk.append((items, pool.submit(swift.stat_objects, container,
+                                            objects, options)))
+        for (idx, future) in singles:
+            try:
+                results[idx] = future.result()
+            except Exception as e:
+                results[idx] = e
+        for (items, future) in bulk:
+            try:
+                stats = future.result()
+            except Exception as e:
+                stats = dict((obj, e) for (_, obj) in items)
+            for (idx, obj) in items:
+                results[idx] = stats[obj]
+    return results
+
+
+def _names(entries, details):
+    for entry in entries:
+        yield entry if details else entry["name"]
+
+
+def listdir(url, options=None, details=False):
+    """
+    List the files and directories directly inside a local directory,
+    Swift container (or "directory" within one, with "/" as the separator)
+    or HTTP directory index. Entries are produced as they are listed, so
+    large Swift containers are fetched a page at a time.
+    :param url: local path or URL of the directory
+    :param options: options passed to the transport (e.g., Swift auth)
+    :param details: if set, produce dicts with the "name", "size", "mtime"
+    and "is_dir" of each entry instead of just the names. The details come
+    from the listing itself when the transport provides them (Swift does,
+    HTTP indexes don't, in which case size and mtime are None).
+    :return: generator of full paths or URLs (or dicts)
+    """
+    transport = wandio.transport.find(url)
+    return _names(transport.listdir(url, options=options, details=details),
+                  details)
+
+
+def glob(pattern, options=None, details=False):
+    """
+    Find the files matching a shell-style pattern, e.g. "/data/*.gz",
+    "swift://container/2019/01/*.gz" or "http://host/data/*.gz". As with
+    glob.glob, wildcards don't match "/". For Swift, the part of the
+    pattern before the first wildcard is used as a prefix by the server, so
+    only the matching part of the container is listed.
+    :param pattern: path or URL pattern
+    :param options: options passed to the transport
+    :param details: see listdir
+    :return: generator of the matching paths or URLs (or dicts)
+    """
+    transport = wandio.transport.find(pattern)
+    return _names(transport.glob(pattern, options=options, details=details),
+                  details)
+
+
+def plan_splits(filename, n, options=None, index=None):
+    """
+    Divide a file into (about) n byte ranges of similar size, to be read by
+    separate workers with wandio.open(filename, byte_range=split). Every
+    line of the file is read by exactly one worker.
+    Compressed files can only be split at the points of a gzip index (see
+    wandio.GzipIndex) that has been filled by reading the file once; the
+    ranges are then offsets in the decompressed data, and the last range
+    is open-ended. Without an index a compressed file is a single split.
+    :param filename: local path or URL of the file
+    :param n: number of splits
+    :param options: options passed to stat
+    :param index: GzipIndex of the (compressed) file, if there is one
+    :return: list of (start, end) tuples, where end may be None for "until
+    the end of the file"
+    """
+    if n < 1:
+        raise ValueError("Number of splits must be at least 1")
+    if wandio.codec.find_by_filename(filename) is not None:
+        if index is None or not index.offsets:
+            return [(0, None)]
+        # the size of the decompressed data isn't known, so spread the
+        # splits over the offsets that the index covers
+        offsets = index.offsets
+        bounds = [0]
+        for i in range(1, n):
+            target = offsets[-1] * i // n
+            offset = min(offsets, key=lambda o: abs(o - target))
+            if offset > bounds[-1]:
+                bounds.append(offset)
+        bounds.append(None)
     else:
-        statfunc = wandio.file.file_stat
-
-    return statfunc(filename)
+        size = wandio_stat(filename, options=options)["size"]
+        if size is None:
+            return [(0, None)]
+        bounds = sorted(set(size * i // n for i in range(n + 1)))
+        if len(bounds) == 1:
+            # empty file
+            bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def copyfileobj(fsrc, fdst, length=64*1024):
+    """
+    Like shutil.copyfileobj, but reuses a single buffer via readinto so that
+    no intermediate objects are created for each chunk copied. Sources that
+    can't readinto (e.g. text files) are copied with read instead, with
+    text encoded as UTF-8 (fdst must be binary)
+    """
+    buf = bytearray(length)
+    with memoryview(buf) as view:
+        while True:
+            try:
+                n = fsrc.readinto(buf)
+            except io.UnsupportedOperation:
+                break
+            if not n:
+                return
+            fdst.write(view[:n])
+    while True:
+        data = fsrc.read(length)
+        if not data:
+            break
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        fdst.write(data)
+
+
+def _print_stats(stats):
+    sys.stderr.write(wandio.stats.format_stats(stats) + "\n")
 
 
 def read_main():
@@ -157,65 +670,135 @@ def read_main():
                         type=str, default='r',
                         help="Open files using this file mode")
 
+    parser.add_argument('-t', '--threaded', required=False,
+                        action='store_true',
+                        help="Read and decompress in a background thread")
+
+    parser.add_argument('-j', '--workers', required=False,
+                        type=int, default=1,
+                        help="Number of threads to decompress multi-stream bzip2 files with")
+
+    parser.add_argument('-c', '--connections', required=False,
+                        type=int, default=1,
+                        help="Number of connections to download HTTP and Swift files over")
+
+    parser.add_argument('-p', '--prefetch', required=False,
+                        type=int, default=2,
+                        help="Number of files to open ahead of the one being read")
+
+    parser.add_argument('-s', '--stats', required=False,
+                        action='store_true',
+                        help="Print I/O statistics for each file to stderr")
+
     opts = vars(parser.parse_args())
 
-    for filename in opts['files']:
-        with Reader(filename, mode=opts['file_mode']) as fh:
-            if opts['use_next']:
-                # sys.stderr.write("Reading using 'next'\n")
-                for line in fh:
-                    sys.stdout.write(line)
-            elif opts['use_readline']:
-                # sys.stderr.write("Reading using 'readline'\n")
+    # lines are returned as bytes when reading in binary mode
+    line_out = sys.stdout
+    if opts['file_mode'] == 'rb':
+        line_out = sys.stdout.buffer
+
+    reader_opts = dict(mode=opts['file_mode'], threaded=opts['threaded'],
+                       workers=opts['workers'],
+                       connections=opts['connections'])
+    if opts['stats']:
+        reader_opts['stats_callback'] = _print_stats
+    if len(opts['files']) > 1:
+        # read the files as one stream, opening the next ones in the
+        # background
+        reader = open_many(opts['files'], prefetch=opts['prefetch'],
+                           **reader_opts)
+    else:
+        reader = Reader(opts['files'][0], **reader_opts)
+
+    with reader as fh:
+        if opts['use_next']:
+            # sys.stderr.write("Reading using 'next'\n")
+            for line in fh:
+                line_out.write(line)
+        elif opts['use_readline']:
+            # sys.stderr.write("Reading using 'readline'\n")
+            line = fh.readline()
+            while line:
+                line_out.write(line)
                 line = fh.readline()
-                while line:
-                    sys.stdout.write(line)
-                    line = fh.readline()
-            else:
-                # sys.stderr.write("Reading using 'shutil'\n")
-                if (sys.version_info > (3, 0)):
-                    try:
-                        shutil.copyfileobj(fh, sys.stdout.buffer)
-                    except BrokenPipeError:
-                        devnull = os.open(os.devnull, os.O_WRONLY)
-                        os.dup2(devnull, sys.stdout.fileno())
-                        sys.exit(1)
-                else:
-                    try:
-                        shutil.copyfileobj(fh, sys.stdout)
-                    except IOError as e:
-                        if e.errno != errno.EPIPE:
-                            # if it is not a BrokenPipeError, raise the error.
-                            raise e
-                        devnull = os.open(os.devnull, os.O_WRONLY)
-                        os.dup2(devnull, sys.stdout.fileno())
-                        sys.exit(1)
+        else:
+            # sys.stderr.write("Reading using 'shutil'\n")
+            try:
+                copyfileobj(fh, sys.stdout.buffer)
+            except BrokenPipeError:
+                devnull = os.open(os.devnull, os.O_WRONLY)
+                os.dup2(devnull, sys.stdout.fileno())
+                sys.exit(1)
 
 def write_main():
     parser = argparse.ArgumentParser(description="""
-    Reads from stdin and writes to a file. Supports any compression/transport
-    that pywandio supports. E.g. HTTP, Swift, gzip, bzip
+    Reads from stdin and writes to a file (or several files at once). Supports
+    any compression/transport that pywandio supports. E.g. HTTP, Swift, gzip,
+    bzip
     """)
 
-    parser.add_argument('file', help='File to write to')
+    parser.add_argument('files', nargs='+', metavar='file',
+                        help='File(s) to write to')
+
+    parser.add_argument('-e', '--on-error', required=False,
+                        choices=[wandio.tee.ON_ERROR_ABORT,
+                                 wandio.tee.ON_ERROR_DROP],
+                        default=wandio.tee.ON_ERROR_ABORT,
+                        help="When writing several files and one fails, "
+                             "abort them all or carry on with the others")
+
+    parser.add_argument('-j', '--workers', required=False,
+                        type=int, default=1,
+                        help="Number of threads to compress with")
+
+    parser.add_argument('-z', '--compresslevel', required=False,
+                        type=int,
+                        help="Compression level (trades speed for size)")
+
+    parser.add_argument('-s', '--stats', required=False,
+                        action='store_true',
+                        help="Print I/O statistics to stderr")
 
     opts = vars(parser.parse_args())
 
-    with Writer(opts["file"]) as out_fh:
+    callback = _print_stats if opts["stats"] else None
+    files = opts["files"]
+    with Writer(files if len(files) > 1 else files[0],
+                options={"compresslevel": opts["compresslevel"]},
+                workers=opts["workers"], stats_callback=callback,
+                on_error=opts["on_error"]) as out_fh:
         with Reader("-") as in_fh:
-            for line in in_fh:
-                out_fh.write(line)
+            # lets the compressor work on batches of lines
+            out_fh.writelines(in_fh)
+    for (filename, error) in out_fh.errors().items():
+        sys.stderr.write("%s: %s\n" % (filename, error))
 
 
 def stat_main():
     parser = argparse.ArgumentParser(description="""
-    Obtains and prints statistics about the given file (either local or remote)
+    Obtains and prints statistics about the given files (either local or
+    remote)
     """)
 
-    parser.add_argument('file', help='File to obtain statistics for')
+    parser.add_argument('files', nargs='+',
+                        help='Files to obtain statistics for')
+
+    parser.add_argument('-c', '--concurrency', required=False,
+                        type=int, default=DEFAULT_STAT_CONCURRENCY,
+                        help="Number of files to stat at a time")
 
     opts = vars(parser.parse_args())
 
-    s = wandio_stat(opts["file"])
-    print("mtime: %s" % s["mtime"])
-    print("size: %s" % s["size"])
+    results = stat_many(opts["files"], concurrency=opts["concurrency"])
+    failed = False
+    for (filename, s) in zip(opts["files"], results):
+        # only label the output when there is more than one file
+        prefix = "%s: " % filename if len(opts["files"]) > 1 else ""
+        if isinstance(s, Exception):
+            sys.stderr.write("%s: %s\n" % (filename, s))
+            failed = True
+            continue
+        print("%smtime: %s" % (prefix, s["mtime"]))
+        print("%ssize: %s" % (prefix, s["size"]))
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,42 @@
+"""
+Loading of codecs and transports that other packages provide through entry
+points, e.g. in their setup.py:
+
+    entry_points={
+        "wandio.codecs": ["brotli = wandio_brotli:codec"],
+        "wandio.transports": ["s3 = wandio_s3:transport"],
+    }
+
+where wandio_brotli.codec is a wandio.codec.Codec and wandio_s3.transport a
+wandio.transport.Transport. Entry points are only looked at when a file
+doesn't match any of the codecs or transports that are already registered.
+"""
+
+CODEC_GROUP = "wandio.codecs"
+TRANSPORT_GROUP = "wandio.transports"
+
+
+def entry_points(group):
+    """
+    Get the entry points in the given group, from all installed packages
+    """
+    try:
+        import importlib.metadata as metadata
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            return []
+        return list(pkg_resources.iter_entry_points(group))
+    eps = metadata.entry_points()
+    if hasattr(eps, "select"):
+        return list(eps.select(group=group))
+    # python < 3.10 returns a dict of groups
+    return list(eps.get(group, []))
+
+
+def load(group):
+    """
+    Load the objects that the entry points in the given group refer to
+    """
+    return [ep.load() for ep in entry_points(group)]
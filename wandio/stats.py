@@ -0,0 +1,197 @@
+import collections
+import time
+
+import wandio.file
+
+
+class LayerStats(collections.Counter):
+    """
+    Counters (bytes, calls, seconds, ...) kept by one layer of a reader or
+    writer
+    """
+
+
+def timed(stats, name, func, *args):
+    """
+    Call func, adding the time it took to stats[name + "_time"] and
+    counting the call in stats[name + "_calls"]
+    """
+    start = time.time()
+    try:
+        return func(*args)
+    finally:
+        stats[name + "_time"] += time.time() - start
+        stats[name + "_calls"] += 1
+
+
+def _child(layer):
+    child = getattr(layer, "child_reader", None)
+    if child is None:
+        child = getattr(layer, "child_writer", None)
+    if child is None:
+        child = getattr(layer, "fh", None)
+    if isinstance(child, (wandio.file.GenericReader,
+                          wandio.file.GenericWriter)):
+        return child
+    return None
+
+
+class Stats(object):
+    """
+    Collects the statistics of every layer (transport, codec, thread, ...)
+    of a reader or writer. Layers only keep counters once they have been
+    attached, so instrumentation costs nothing when it isn't used.
+    """
+
+    def __init__(self, filename=None, callback=None):
+        """
+        :param filename: name of the file the stats are for
+        :param callback: if given, called with the stats (see snapshot)
+        when the file is closed
+        """
+        self.filename = filename
+        self.callback = callback
+        self.start = time.time()
+        self.end = None
+        self.top = None
+
+    def attach(self, fh):
+        """
+        Start collecting statistics for fh and the layers below it (layers
+        that are already attached are left alone)
+        """
+        self.top = fh
+        layer = fh
+        while layer is not None:
+            if layer.io_stats is None:
+                layer.io_stats = LayerStats()
+            layer = _child(layer)
+
+    def snapshot(self):
+        """
+        Get the statistics collected so far, as a dict with the file name,
+        the time (in seconds) since the file was opened and a list of the
+        counters of each layer, from the top layer down. Transports also
+        report their time to first byte.
+        """
+        layers = []
+        layer = self.top
+        while layer is not None:
+            counters = collections.OrderedDict(layer=type(layer).__name__)
+            counters.update(sorted(layer.io_stats.items()))
+            ttfb = getattr(layer, "ttfb", None)
+            if ttfb is not None:
+                counters["ttfb"] = ttfb
+            layers.append(counters)
+            layer = _child(layer)
+        return {
+            "filename": self.filename,
+            "elapsed": (self.end or time.time()) - self.start,
+            "layers": layers,
+        }
+
+    def close(self):
+        if self.end is not None:
+            return
+        self.end = time.time()
+        if self.callback is not None:
+            self.callback(self.snapshot())
+
+
+def format_stats(snapshot):
+    """
+    Format stats (as returned by Stats.snapshot) for humans
+    """
+    lines = ["%s: elapsed=%.3f" % (snapshot["filename"],
+                                   snapshot["elapsed"])]
+    for counters in snapshot["layers"]:
+        fields = []
+        for (key, value) in counters.items():
+            if key == "layer":
+                continue
+            if isinstance(value, float):
+                fields.append("%s=%.3f" % (key, value))
+            else:
+                fields.append("%s=%s" % (key, value))
+        lines.append("  %s: %s" % (counters["layer"], " ".join(fields))
+                     if fields else "  %s" % counters["layer"])
+    return "\n".join(lines)
+
+
+class StatsReader(wandio.file.GenericReader):
+    """
+    Counts the calls made to a reader, the bytes and lines it returns and
+    the time spent in it
+    """
+
+    def __init__(self, fh):
+        super(StatsReader, self).__init__(fh)
+        self.io_stats = LayerStats()
+
+    def _count(self, data):
+        stats = self.io_stats
+        if data:
+            stats["bytes"] += len(data)
+        return data
+
+    def read(self, *args):
+        return self._count(timed(self.io_stats, "read", self.fh.read, *args))
+
+    def readinto(self, b):
+        n = timed(self.io_stats, "read", self.fh.readinto, b)
+        self.io_stats["bytes"] += n
+        return n
+
+    def readline(self):
+        line = self._count(timed(self.io_stats, "read", self.fh.readline))
+        if line:
+            self.io_stats["lines"] += 1
+        return line
+
+    def __iter__(self):
+        stats = self.io_stats
+        lines = iter(self.fh)
+        while True:
+            start = time.time()
+            line = next(lines, None)
+            stats["read_time"] += time.time() - start
+            if line is None:
+                return
+            stats["lines"] += 1
+            stats["bytes"] += len(line)
+            yield line
+
+    def __next__(self):
+        line = timed(self.io_stats, "read", next, self.fh)
+        self.io_stats["lines"] += 1
+        return self._count(line)
+
+
+class StatsWriter(wandio.file.GenericWriter):
+    """
+    Counts the calls made to a writer, the bytes written to it and the time
+    spent in it
+    """
+
+    def __init__(self, fh):
+        super(StatsWriter, self).__init__(fh)
+        self.io_stats = LayerStats()
+
+    def write(self, data):
+        timed(self.io_stats, "write", self.fh.write, data)
+        self.io_stats["bytes"] += len(data)
+
+    def writelines(self, lines):
+        stats = self.io_stats
+
+        def count(lines):
+            for line in lines:
+                stats["bytes"] += len(line)
+                yield line
+        timed(stats, "writelines", self.fh.writelines, count(lines))
+
+    def flush(self):
+        timed(self.io_stats, "flush", self.fh.flush)
+
+    def close(self):
+        timed(self.io_stats, "close", self.fh.close)
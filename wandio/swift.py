@@ -1,12 +1,37 @@
-import io
+import calendar
+import collections
+import concurrent.futures
+import email.utils
+import fnmatch
+import json
+import os
+import re
+import threading
+import time
 import swiftclient
+import swiftclient.client
 import swiftclient.service
+from urllib.parse import quote, unquote
 import wandio.file
 
 CHUNK_SIZE = 1 * 1024 * 1024
 
 SEGMENT_SIZE = 1073741824
+# segment size of SwiftWriter, which buffers each segment in memory
+STREAM_SEGMENT_SIZE = 64 * 1024 * 1024
 SEGMENT_CONTAINER_TMPL = ".%s-segments"
+# number of segments uploaded at once by SwiftWriter
+SEGMENT_THREADS = 2
+
+# how long auth tokens are reused for (Keystone's default token lifetime),
+# unless the auth service says they expire sooner (or the "token_ttl"
+# option is set); connections re-authenticate by themselves if a token is
+# rejected earlier
+TOKEN_TTL = 3600
+# tokens are replaced this many seconds before they expire
+TOKEN_EXPIRY_MARGIN = 60
+# number of idle connections kept for each set of options
+MAX_IDLE_CONNECTIONS = 10
 
 DEFAULT_OPTIONS = {
     "os_auth_url": "https://hermes-auth.caida.org",
@@ -35,6 +60,243 @@ def process_options(options=None):
     return options
 
 
+def _options_key(options):
+    return repr(sorted(options.items()))
+
+
+def _parse_keystone_time(value):
+    # e.g. "2026-10-18T12:00:00.000000Z" (always UTC)
+    return calendar.timegm(time.strptime(value[:19], "%Y-%m-%dT%H:%M:%S"))
+
+
+def _auth_v1(conn):
+    """
+    Authenticate in the same way as swiftclient does with v1 auth, but also
+    get the token's lifetime, which tempauth and swauth send
+    :param conn:
+    :return: (storage url, token, expiry time or None)
+    """
+    (parsed, http_conn) = conn.http_connection(conn.authurl)
+    try:
+        http_conn.request("GET", parsed.path, "",
+                          {"X-Auth-User": conn.user, "X-Auth-Key": conn.key})
+        resp = http_conn.getresponse()
+        body = resp.read()
+    finally:
+        http_conn.close()
+    url = resp.getheader("x-storage-url")
+    if resp.status < 200 or resp.status >= 300 or (body and not url):
+        raise swiftclient.ClientException.from_response(
+            resp, "Auth GET failed", body)
+    token = resp.getheader("x-storage-token", resp.getheader("x-auth-token"))
+    url = conn.os_options.get("object_storage_url") or url
+    expires = resp.getheader("x-auth-token-expires")
+    if expires is not None:
+        expires = time.time() + float(expires)
+    return url, token, expires
+
+
+def _keystone_token_expiry(conn, token):
+    """
+    Ask Keystone (v3) when a token expires, since swiftclient doesn't pass
+    on the auth response (which says)
+    :param conn:
+    :param token:
+    :return: expiry time (seconds since the epoch), or None if that can't
+    be found out
+    """
+    url = conn.authurl.rstrip("/")
+    if not swiftclient.client.VERSIONFUL_AUTH_PATH.search(url):
+        url += "/v3"
+    try:
+        (parsed, http_conn) = conn.http_connection(url + "/auth/tokens")
+        try:
+            http_conn.request("GET", parsed.path, "",
+                              {"X-Auth-Token": token,
+                               "X-Subject-Token": token})
+            resp = http_conn.getresponse()
+            body = resp.read()
+        finally:
+            http_conn.close()
+        if resp.status != 200:
+            return None
+        return _parse_keystone_time(json.loads(body)["token"]["expires_at"])
+    except Exception:
+        # the token itself is fine, so just reuse it for token_ttl
+        return None
+
+
+def _authenticate(conn):
+    """
+    Authenticate a connection
+    :param conn:
+    :return: (storage url, token, expiry time), where the expiry time (in
+    seconds since the epoch) is None if the auth service didn't say
+    """
+    if conn.session is None and \
+            conn.auth_version in swiftclient.client.AUTH_VERSIONS_V1:
+        return _auth_v1(conn)
+    (url, token) = conn.get_auth()
+    expires = None
+    if conn.session is None and \
+            conn.auth_version in swiftclient.client.AUTH_VERSIONS_V3:
+        expires = _keystone_token_expiry(conn, token)
+    return url, token, expires
+
+
+class ConnectionPool(object):
+    """
+    Thread-safe cache of auth tokens and idle swift Connections (and
+    SwiftService instances), keyed by the processed options.
+    Tokens are reused until token_ttl seconds after they were obtained (or
+    the "token_ttl" option, if given), or until shortly before they expire,
+    if the auth service says when that is.
+    A connection whose token is rejected (with a 401) re-authenticates by
+    itself, and the new token is cached when the connection is released.
+    """
+
+    def __init__(self, max_connections=MAX_IDLE_CONNECTIONS,
+                 token_ttl=TOKEN_TTL):
+        self.max_connections = max_connections
+        self.token_ttl = token_ttl
+        self.lock = threading.Lock()
+        # serializes authentication, so that connections opened at the same
+        # time don't all authenticate
+        self.auth_lock = threading.Lock()
+        # key -> (storage url, token, expiry time)
+        self.tokens = {}
+        # key -> list of idle connections
+        self.idle = {}
+        # key -> SwiftService
+        self.services = {}
+        # connection -> (key, token ttl), for connections that are in use
+        self.keys = {}
+
+    def _cached_token(self, key):
+        entry = self.tokens.get(key)
+        if entry is None or entry[2] <= time.time():
+            return None
+        return entry[:2]
+
+    def _cache_token(self, key, url, token, ttl, expires=None):
+        until = time.time() + ttl
+        if expires is not None:
+            until = min(until, expires - TOKEN_EXPIRY_MARGIN)
+        self.tokens[key] = (url, token, until)
+
+    def get_connection(self, options=None):
+        """
+        Get a connection for the given options, which should be handed back
+        with release_connection once it's no longer needed
+        :param options:
+        :return:
+        """
+        options = process_options(options)
+        key = _options_key(options)
+        with self.lock:
+            conns = self.idle.get(key)
+            conn = conns.pop() if conns else None
+            token = self._cached_token(key)
+        if conn is None:
+            conn = swiftclient.service.get_conn(options)
+        ttl = options.get("token_ttl")
+        if ttl is None:
+            ttl = self.token_ttl
+        if not (options["os_auth_token"] and options["os_storage_url"]):
+            # we're responsible for authenticating (rather than using a
+            # token given in the options)
+            if token is None:
+                with self.auth_lock:
+                    with self.lock:
+                        token = self._cached_token(key)
+                    if token is None:
+                        (url, token, expires) = _authenticate(conn)
+                        with self.lock:
+                            self._cache_token(key, url, token, ttl, expires)
+                        token = (url, token)
+            (conn.url, conn.token) = token
+        with self.lock:
+            self.keys[conn] = (key, ttl)
+        return conn
+
+    def release_connection(self, conn):
+        """
+        Hand a connection back to the pool
+        :param conn:
+        :return:
+        """
+        with self.lock:
+            (key, ttl) = self.keys.pop(conn, (None, None))
+            if key is not None:
+                # the connection may have re-authenticated after a 401 (in
+                # which case when the new token expires isn't known)
+                entry = self.tokens.get(key)
+                if entry is not None and conn.token and \
+                        conn.token != entry[1]:
+                    self._cache_token(key, conn.url, conn.token, ttl)
+                conns = self.idle.setdefault(key, [])
+                if len(conns) < self.max_connections:
+                    conns.append(conn)
+                    return
+        conn.close()
+
+    def get_service(self, options=None):
+        """
+        Get a SwiftService for the given options that is shared with other
+        users of the pool (it must not be shut down)
+        :param options:
+        :return:
+        """
+        options = process_options(options)
+        key = _options_key(options)
+        with self.lock:
+            service = self.services.get(key)
+            if service is None:
+                service = swiftclient.service.SwiftService(options=options)
+                self.services[key] = service
+            return service
+
+    def close(self):
+        with self.lock:
+            for conns in self.idle.values():
+                for conn in conns:
+                    conn.close()
+            self.idle = {}
+            self.tokens = {}
+            self.services = {}
+
+
+_default_pool = None
+_default_pool_pid = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    """
+    Get the process-wide connection pool (a new pool is created after a
+    fork, since connections can't be shared between processes)
+    :return:
+    """
+    global _default_pool, _default_pool_pid
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool_pid != os.getpid():
+            _default_pool = ConnectionPool()
+            _default_pool_pid = os.getpid()
+        return _default_pool
+
+
+def set_default_pool(pool):
+    """
+    Replace the process-wide connection pool
+    :param pool:
+    :return:
+    """
+    global _default_pool, _default_pool_pid
+    with _default_pool_lock:
+        _default_pool = pool
+        _default_pool_pid = os.getpid()
+
+
 def get_auth(options=None, connection=None):
     """
     Get the auth URL and auth token for the given options or connection
@@ -43,7 +305,12 @@ def get_auth(options=None, connection=None):
     :return:
     """
     if connection is None:
+        # the pool authenticates (or uses a cached token) when handing out
+        # a connection
         connection = get_connection(options)
+        auth = (connection.url, connection.token)
+        release_connection(connection)
+        return auth
     return connection.get_auth()
 
 
@@ -59,12 +326,22 @@ def get_service(options=None):
 
 def get_connection(options=None):
     """
-    Get a swift Connection instance
+    Get a swift Connection instance from the process-wide pool (using a
+    cached auth token if there is one). Pass it to release_connection
+    when done with it so that it can be reused.
     :param options:
     :return:
     """
-    options = process_options(options)
-    return swiftclient.service.get_conn(options)
+    return get_default_pool().get_connection(options)
+
+
+def release_connection(conn):
+    """
+    Hand a connection obtained with get_connection back to the pool
+    :param conn:
+    :return:
+    """
+    get_default_pool().release_connection(conn)
 
 
 def parse_url(url):
@@ -85,24 +362,128 @@ def parse_url(url):
     }
 
 
-def list(container=None, options=None, swift=None):
+def list(container=None, options=None, swift=None, prefix=None,
+         delimiter=None):
     """
     Get a list of objects in the account or container
     :param container: container to list (if None, the account will be listed)
     :param options:
     :param swift:
+    :param prefix: only list names that start with this prefix
+    :param delimiter: roll names up at this delimiter (see list_objects)
+    :return:
+    """
+    for item in list_objects(container=container, options=options,
+                             swift=swift, prefix=prefix, delimiter=delimiter):
+        yield item["name"] if "name" in item else item["subdir"]
+
+
+def list_objects(container=None, options=None, swift=None, prefix=None,
+                 delimiter=None):
+    """
+    Get the listing entries of the objects in the account or container,
+    which include their size ("bytes"), "last_modified" time and "hash".
+    The prefix and delimiter are applied by the server, and the listing is
+    fetched a page at a time as it is consumed.
+    :param container: container to list (if None, the account will be listed)
+    :param options:
+    :param swift:
+    :param prefix: only list names that start with this prefix
+    :param delimiter: if given, names that contain the delimiter after the
+    prefix are rolled up into a single {"subdir": ...} entry for everything
+    up to (and including) the delimiter
     :return:
     """
     if swift is None:
-        swift = get_service(options)
-    for page in swift.list(container=container):
+        swift = get_default_pool().get_service(options)
+    for page in swift.list(container=container,
+                           options={"prefix": prefix,
+                                    "delimiter": delimiter}):
         if page["success"]:
             for item in page["listing"]:
-                yield item["name"]
+                yield item
         else:
             raise page["error"]
 
 
+# characters that make a name a glob pattern
+_GLOB_MAGIC_RE = re.compile("[*?[]")
+
+
+def _listing_time(last_modified):
+    # e.g. "2019-01-01T00:00:00.000000" (UTC)
+    return calendar.timegm(time.strptime(last_modified[:19],
+                                         "%Y-%m-%dT%H:%M:%S"))
+
+
+def _listing_entry(container, item):
+    if "subdir" in item:
+        return {
+            "name": "swift://%s/%s" % (container, item["subdir"].rstrip("/")),
+            "size": None,
+            "mtime": None,
+            "is_dir": True,
+        }
+    return {
+        "name": "swift://%s/%s" % (container, item["name"]),
+        "size": item["bytes"],
+        "mtime": _listing_time(item["last_modified"]),
+        "is_dir": False,
+    }
+
+
+def _split_url(url):
+    # like parse_url, but the object name may be empty
+    (container, _, obj) = url.replace("swift://", "", 1).partition("/")
+    return container, obj
+
+
+def listdir(url, options=None, swift=None):
+    """
+    List the objects (and pseudo-directories) directly below the given
+    'swift://CONTAINER[/PREFIX]' URL, treating "/" as the directory
+    separator
+    :return: generator of dictionaries with the "name" (URL), "size",
+    "mtime" and "is_dir" of each entry
+    """
+    (container, prefix) = _split_url(url)
+    if prefix and not prefix.endswith("/"):
+        prefix += "/"
+    for item in list_objects(container=container, options=options,
+                             swift=swift, prefix=prefix or None,
+                             delimiter="/"):
+        yield _listing_entry(container, item)
+
+
+def glob(pattern, options=None, swift=None):
+    """
+    Find the objects matching a 'swift://CONTAINER/PATTERN' URL, where the
+    pattern may contain shell-style wildcards (which, as for glob.glob, do
+    not match "/"). The part of the pattern before the first wildcard is
+    sent to the server as a prefix, so only matching parts of the container
+    are listed.
+    :return: generator of dictionaries, as for listdir
+    """
+    (container, obj_pattern) = _split_url(pattern)
+    if _GLOB_MAGIC_RE.search(container):
+        raise ValueError("Container names can't contain wildcards")
+    match = _GLOB_MAGIC_RE.search(obj_pattern)
+    prefix = obj_pattern[:match.start()] if match else obj_pattern
+    # if the wildcards are all in the last path segment, the server can
+    # leave out everything in deeper "directories"
+    delimiter = None if "/" in obj_pattern[len(prefix):] else "/"
+    segments = obj_pattern.split("/")
+    for item in list_objects(container=container, options=options,
+                             swift=swift, prefix=prefix or None,
+                             delimiter=delimiter):
+        name = item["name"] if "name" in item else item["subdir"].rstrip("/")
+        names = name.split("/")
+        if len(names) == len(segments) and \
+                all(fnmatch.fnmatchcase(n, p) for (n, p) in
+                    zip(names, segments)):
+            yield _listing_entry(container, item)
+
+
 def stat(container=None, objects=None, options=None, swift=None):
     """
     Get stats for a list of objects in the account or container
@@ -113,7 +494,7 @@ def stat(container=None, objects=None, options=None, swift=None):
     :return:
     """
     if swift is None:
-        swift = get_service(options)
+        swift = get_default_pool().get_service(options)
     stat_res = swift.stat(container=container, objects=objects)
     if objects is None:
         if not stat_res["success"]:
@@ -126,6 +507,60 @@ def stat(container=None, objects=None, options=None, swift=None):
             yield obj_stat
 
 
+def headers_stat(hdrs):
+    """
+    Get the stat fields (as returned by wandio.stat) from the headers of an
+    object
+    :param hdrs: object headers (with lower-case names, as swiftclient
+    returns them)
+    :return: dictionary with "mtime", "size" and "etag" keys
+    """
+    mtime = hdrs.get("last-modified")
+    if mtime is not None:
+        mtime = email.utils.mktime_tz(email.utils.parsedate_tz(mtime))
+    size = hdrs.get("content-length")
+    if size is not None:
+        size = int(size)
+    return {
+        "mtime": mtime,
+        "size": size,
+        "etag": hdrs.get("etag"),
+    }
+
+
+def object_stat(url, options=None):
+    """
+    Get the stat fields of the object at the given 'swift://CONTAINER/OBJECT'
+    URL (see headers_stat)
+    """
+    parsed_url = parse_url(url)
+    obj_stat = next(stat(container=parsed_url["container"],
+                         objects=[parsed_url["obj"]], options=options))
+    return headers_stat(obj_stat["headers"])
+
+
+def stat_objects(container, objects, options=None, swift=None):
+    """
+    Get the stat fields of several objects in a container at once (the
+    service makes the requests concurrently)
+    :param container:
+    :param objects: object names
+    :param options:
+    :param swift:
+    :return: dictionary mapping each object name to its stat fields (see
+    headers_stat), or to the exception raised when trying to stat it
+    """
+    if swift is None:
+        swift = get_default_pool().get_service(options)
+    res = {}
+    for obj_stat in swift.stat(container=container, objects=objects):
+        if obj_stat["success"]:
+            res[obj_stat["object"]] = headers_stat(obj_stat["headers"])
+        else:
+            res[obj_stat["object"]] = obj_stat["error"]
+    return res
+
+
 def upload(local_file, container, obj, options=None, swift=None):
     """
     Upload a local file (or file-like object) to the given container and object
@@ -137,7 +572,7 @@ def upload(local_file, container, obj, options=None, swift=None):
     :return:
     """
     if swift is None:
-        swift = get_service(options)
+        swift = get_default_pool().get_service(options)
     suo = swiftclient.service.SwiftUploadObject(local_file, object_name=obj)
     results = swift.upload(container, [suo], options={
         "segment_size": SEGMENT_SIZE,
@@ -168,7 +603,7 @@ def download(container, obj, local_file=None, local_dir=None,
     :return:
     """
     if swift is None:
-        swift = get_service(options)
+        swift = get_default_pool().get_service(options)
     if local_file is not None:
         opts = {"out_file": local_file}
     elif local_dir is not None:
@@ -191,44 +626,306 @@ def delete(container=None, objects=None, options=None, swift=None):
     :return:
     """
     if swift is None:
-        swift = get_service(options)
+        swift = get_default_pool().get_service(options)
     res_iter = swift.delete(container=container, objects=objects)
     for res in res_iter:
         if not res["success"]:
             raise res["error"]
 
 
-class SwiftReader(wandio.file.GenericReader):
+class ThreadConnections(object):
+    """
+    Hands out one pooled connection per thread (swift connections can't be
+    shared between threads), and releases them all at once
+    """
+
+    def __init__(self, options=None):
+        self.options = options
+        self.local = threading.local()
+        self.conns = []
 
-    def __init__(self, url, options=None):
+    def get(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = get_connection(self.options)
+            self.local.conn = conn
+            self.conns.append(conn)
+        return conn
+
+    def release(self):
+        for conn in self.conns:
+            release_connection(conn)
+        self.conns = []
+        self.local = threading.local()
+
+
+def object_size(conn, container, obj):
+    """
+    Get the size of an object (for a DLO manifest whose size isn't reported,
+    this is the total size of its segments)
+    :param conn: swift connection
+    :param container:
+    :param obj:
+    :return: size in bytes
+    """
+    hdrs = conn.head_object(container, obj)
+    size = int(hdrs.get("content-length", 0))
+    manifest = hdrs.get("x-object-manifest")
+    if not size and manifest:
+        (seg_container, prefix) = unquote(manifest).split("/", 1)
+        (_, listing) = conn.get_container(seg_container, prefix=prefix,
+                                          full_listing=True)
+        size = sum(item["bytes"] for item in listing)
+    return size
+
+
+class SwiftRangeReader(wandio.file.RangeReader):
+    """
+    Downloads byte ranges of a Swift object over several connections at once
+    """
+
+    def __init__(self, container, obj, size, connections, options=None,
+                 **kwargs):
+        self.container = container
+        self.object = obj
+        self.conns = ThreadConnections(options)
+        super(SwiftRangeReader, self).__init__(size, connections, **kwargs)
+
+    def _fetch_range(self, start, end):
+        (hdrs, data) = self.conns.get().get_object(
+            self.container, self.object,
+            headers={"Range": "bytes=%d-%d" % (start, end - 1)})
+        return data
+
+    def close(self):
+        super(SwiftRangeReader, self).close()
+        # wait for ranges that are still being fetched before handing their
+        # connections back
+        self.pool.shutdown(wait=True)
+        self.conns.release()
+
+
+class SwiftReader(wandio.file.TransportReader):
+
+    def __init__(self, url, options=None, connections=1, byte_range=None,
+                 **kwargs):
+        """
+        :param url: 'swift://CONTAINER/OBJECT' URL to read
+        :param options: swift options
+        :param connections: number of connections to download the object
+        over (if more than one, byte ranges are fetched concurrently)
+        :param byte_range: (start, end) tuple: read from offset start, on
+        the assumption that reading will stop at about end (or None)
+        :param kwargs: range_size and max_buffer options for SwiftRangeReader
+        """
+        self.open_time = time.time()
+        self.first_byte_time = None
+        (start, end) = byte_range or (0, None)
+        parsed_url = parse_url(url)
         self.conn = get_connection(options)
-        (hdr, body) = self.conn.get_object(resp_chunk_size=CHUNK_SIZE,
-                                           **parse_url(url))
+        if connections > 1:
+            size = object_size(self.conn, **parsed_url)
+            body = SwiftRangeReader(parsed_url["container"],
+                                    parsed_url["obj"], size, connections,
+                                    options=options, limit=end, **kwargs)
+            if start:
+                body.seek(start)
+        else:
+            headers = {"Range": "bytes=%d-" % start} if start else None
+            (hdr, body) = self.conn.get_object(resp_chunk_size=CHUNK_SIZE,
+                                               headers=headers, **parsed_url)
+            if start and "content-range" not in hdr:
+                body.close()
+                release_connection(self.conn)
+                raise IOError("Swift did not honor range request for %s" %
+                              url)
+            self.first_byte_time = time.time()
         super(SwiftReader, self).__init__(body)
 
+    @property
+    def ttfb(self):
+        """
+        Seconds from opening the object until the first data was received
+        (see HttpReader.ttfb)
+        """
+        return wandio.file.time_to_first_byte(self)
+
     def close(self):
         if self.conn:
-            self.conn.close()
+            self.fh.close()
+            release_connection(self.conn)
+            self.conn = None
 
 
-# TODO: figure out how to stream to swift rather than buffer all in memory
 class SwiftWriter(wandio.file.GenericWriter):
+    """
+    Streams data to a Swift object. Data is cut into segments of
+    segment_size bytes, which are uploaded by segment_threads threads while
+    writing continues, and a manifest joining the segments is written on
+    close. At most segment_threads segments are being uploaded at a time,
+    so memory use is bounded by about (segment_threads + 1) * segment_size.
+    Objects smaller than one segment are uploaded directly.
+    """
 
-    def __init__(self, url, options=None, use_bytes_io=False):
+    def __init__(self, url, options=None, use_bytes_io=False,
+                 segment_size=None, segment_threads=None):
+        """
+        :param url: 'swift://CONTAINER/OBJECT' URL to write to
+        :param options: swift options ("segment_size" and "segment_threads"
+        are used if given)
+        :param use_bytes_io: expect bytes rather than strings to be written
+        :param segment_size: size of each segment (overrides options)
+        :param segment_threads: number of segments to upload at once
+        (overrides options)
+        """
         parsed_url = parse_url(url)
         self.container = parsed_url["container"]
         self.object = parsed_url["obj"]
         self.options = options
-        if use_bytes_io:
-            self.buffer = io.BytesIO()
-        else:
-            self.buffer = io.StringIO()
-        super(SwiftWriter, self).__init__(self.buffer)
+        self.binary = use_bytes_io
+        opts = options or {}
+        self.segment_size = int(segment_size or opts.get("segment_size") or
+                                STREAM_SEGMENT_SIZE)
+        self.segment_threads = int(segment_threads or
+                                   opts.get("segment_threads") or
+                                   SEGMENT_THREADS)
+        self.segment_container = SEGMENT_CONTAINER_TMPL % self.container
+        # same layout as the segments that swiftclient uploads
+        self.segment_prefix = "%s/%f/%d/" % (self.object, time.time(),
+                                             self.segment_size)
+        self.buffer = bytearray()
+        self.segments = 0
+        self.pending = collections.deque()
+        self.pool = None
+        self.error = None
+        self.closed = False
+        self.conns = ThreadConnections(options)
+        super(SwiftWriter, self).__init__(None)
+
+    def _put_container(self, container):
+        try:
+            self.conns.get().put_container(container)
+        except swiftclient.ClientException:
+            # failing to create a container is a warning, not an error (see
+            # upload above)
+            pass
+
+    def _put_object(self, container, obj, data, headers=None):
+        # swiftclient takes anything but bytes to be an iterable of chunks
+        # (this copies the buffers that are handed over, once)
+        self.conns.get().put_object(container, obj, bytes(data),
+                                    headers=headers)
+
+    def _wait(self, future):
+        try:
+            future.result()
+        except BaseException as e:
+            self.error = e
+            raise
+
+    def _upload_segment(self, segment):
+        if self.pool is None:
+            self._put_container(self.segment_container)
+            self.pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.segment_threads)
+        # wait for an upload to finish before buffering any more segments
+        while len(self.pending) >= self.segment_threads:
+            self._wait(self.pending.popleft())
+        name = "%s%08d" % (self.segment_prefix, self.segments)
+        self.pending.append(self.pool.submit(
+            self._put_object, self.segment_container, name, segment))
+        self.segments += 1
 
     def flush(self):
         pass
 
+    def write(self, data):
+        if self.error is not None:
+            raise self.error
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        data = memoryview(data)
+        # fill the buffer up to a segment at a time, and hand it over to
+        # be uploaded whole (rather than copying the segment out of it and
+        # moving the rest of the buffer down)
+        while len(self.buffer) + len(data) >= self.segment_size:
+            size = self.segment_size - len(self.buffer)
+            self.buffer += data[:size]
+            data = data[size:]
+            (segment, self.buffer) = (self.buffer, bytearray())
+            self._upload_segment(segment)
+        self.buffer += data
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def prepare(self):
+        """
+        Finish uploading the data written so far, without making the object
+        visible yet (see commit)
+        """
+        if self.error is not None:
+            # don't write a manifest for an incomplete object
+            raise self.error
+        if self.pool is None:
+            # small objects are uploaded in one go by commit
+            return
+        if len(self.buffer):
+            self._upload_segment(self.buffer)
+        self.buffer = bytearray()
+        while self.pending:
+            self._wait(self.pending.popleft())
+
+    def commit(self):
+        """
+        Write the object (or the manifest joining its segments), once
+        prepare has been called
+        """
+        self._put_container(self.container)
+        if self.pool is None:
+            self._put_object(self.container, self.object, self.buffer)
+            return
+        manifest = "%s/%s" % (quote(self.segment_container),
+                              quote(self.segment_prefix))
+        self._put_object(self.container, self.object, b"",
+                         headers={"X-Object-Manifest": manifest})
+
+    def abort(self):
+        """
+        Give up on writing the object, removing the segments that have
+        already been uploaded (if possible)
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.pool is not None:
+                for future in self.pending:
+                    future.cancel()
+                self.pool.shutdown(wait=True)
+                self.pool = None
+                conn = self.conns.get()
+                for i in range(self.segments):
+                    try:
+                        conn.delete_object(
+                            self.segment_container,
+                            "%s%08d" % (self.segment_prefix, i))
+                    except swiftclient.ClientException:
+                        pass
+        finally:
+            self.conns.release()
+
     def close(self):
-        self.buffer.seek(0)
-        upload(self.buffer, container=self.container,
-               obj=self.object, options=self.options)
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.prepare()
+            self.commit()
+        finally:
+            if self.pool is not None:
+                for future in self.pending:
+                    future.cancel()
+                self.pool.shutdown(wait=True)
+            self.conns.release()
@@ -0,0 +1,195 @@
+import queue
+import threading
+
+import wandio.file
+import wandio.stats
+
+DEFAULT_QUEUE_DEPTH = 8
+
+# what to do when writing to one of the destinations fails
+ON_ERROR_ABORT = "abort"
+ON_ERROR_DROP = "drop"
+
+
+class _Sink(object):
+    """
+    Writes the data handed to it to one destination, in a background thread
+    """
+
+    def __init__(self, name, writer, queue_depth):
+        self.name = name
+        self.writer = writer
+        self.queue = queue.Queue(maxsize=queue_depth)
+        self.error = None
+        self.thread = threading.Thread(target=self._consume,
+                                       name="wandio-tee")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _consume(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            if self.error is not None:
+                # keep taking data so that the writer doesn't block on us
+                continue
+            try:
+                self.writer.write(data)
+            except BaseException as e:
+                self.error = e
+        if self.error is None:
+            try:
+                if hasattr(self.writer, "prepare"):
+                    self.writer.prepare()
+            except BaseException as e:
+                self.error = e
+
+    def put(self, data):
+        self.queue.put(data)
+
+    def finish(self):
+        """
+        Wait for the data to be written out
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def commit(self):
+        if hasattr(self.writer, "commit"):
+            self.writer.commit()
+        else:
+            # writers that can't defer making their data visible
+            self.writer.close()
+
+    def abort(self):
+        if hasattr(self.writer, "abort"):
+            self.writer.abort()
+        else:
+            self.writer.close()
+
+
+class TeeWriter(wandio.file.GenericWriter):
+    """
+    Writes the same data to several (binary) writers at once, each from its
+    own thread. Each writer has a queue of up to queue_depth blocks, and
+    writing blocks while the slowest writer's queue is full.
+    Writers that have prepare/commit/abort methods (see
+    wandio.transport.Transport) are only committed once every writer has
+    finished writing, so that (unless committing itself fails) either all
+    destinations get the complete data or none do. If a writer fails, the
+    on_error policy decides whether the others are aborted too ("abort")
+    or carry on without it ("drop"), in which case the error is only
+    raised if every writer fails, and is kept in errors.
+    """
+
+    def __init__(self, writers, names=None, on_error=ON_ERROR_ABORT,
+                 queue_depth=DEFAULT_QUEUE_DEPTH):
+        """
+        :param writers: binary writers to write to
+        :param names: names of the writers' destinations (for errors)
+        :param on_error: "abort" or "drop"
+        :param queue_depth: number of blocks that may be queued for each
+        writer
+        """
+        if on_error not in [ON_ERROR_ABORT, ON_ERROR_DROP]:
+            raise ValueError("on_error must be '%s' or '%s'" %
+                             (ON_ERROR_ABORT, ON_ERROR_DROP))
+        if queue_depth < 1:
+            raise ValueError("queue_depth must be at least 1")
+        if names is None:
+            names = [str(i) for i in range(len(writers))]
+        self.on_error = on_error
+        self.sinks = [_Sink(name, writer, queue_depth)
+                      for (name, writer) in zip(names, writers)]
+        # destination name -> exception, for destinations that failed
+        self.errors = {}
+        self.closed = False
+        super(TeeWriter, self).__init__(None)
+
+    def _check(self):
+        failed = [sink for sink in self.sinks if sink.error is not None]
+        if not failed:
+            return
+        if self.on_error == ON_ERROR_ABORT or len(failed) == len(self.sinks):
+            raise failed[0].error
+
+    def write(self, data):
+        self._check()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        elif not isinstance(data, bytes):
+            # the caller may reuse its buffer once we return
+            data = bytes(data)
+        stats = self.io_stats
+        for sink in self.sinks:
+            if sink.error is not None:
+                continue
+            if stats is None:
+                sink.put(data)
+            else:
+                # time spent waiting for slow destinations
+                wandio.stats.timed(stats, "queue_wait", sink.put, data)
+        if stats is not None:
+            stats["bytes"] += len(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def abort(self):
+        """
+        Stop writing, and abort every destination
+        """
+        if self.closed:
+            return
+        self.closed = True
+        for sink in self.sinks:
+            sink.finish()
+        for sink in self.sinks:
+            try:
+                sink.abort()
+            except Exception:
+                pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # the writers finish writing (and prepare) concurrently
+        for sink in self.sinks:
+            sink.finish()
+        failed = [sink for sink in self.sinks if sink.error is not None]
+        for sink in failed:
+            self.errors[sink.name] = sink.error
+        if failed and (self.on_error == ON_ERROR_ABORT or
+                       len(failed) == len(self.sinks)):
+            to_abort = self.sinks
+            to_commit = []
+        else:
+            to_abort = failed
+            to_commit = [sink for sink in self.sinks if sink.error is None]
+        for sink in to_abort:
+            try:
+                sink.abort()
+            except Exception:
+                pass
+        if len(to_abort) == len(self.sinks):
+            raise failed[0].error
+        error = None
+        committed = 0
+        for sink in to_commit:
+            try:
+                sink.commit()
+                committed += 1
+            except Exception as e:
+                self.errors[sink.name] = e
+                if error is None:
+                    error = e
+        if error is not None and (self.on_error == ON_ERROR_ABORT or
+                                  not committed):
+            raise error
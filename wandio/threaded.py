@@ -0,0 +1,70 @@
+import queue
+import threading
+
+import wandio.file
+import wandio.stats
+
+DEFAULT_QUEUE_DEPTH = 4
+
+
+class ThreadedReader(wandio.file.BlockReader):
+    """
+    Reads (and decompresses) data from the child reader in a background
+    thread, handing blocks to the consumer through a bounded queue.
+    Like libwandio's thread layer, this lets I/O and decompression overlap
+    with whatever the consumer does with the data.
+    """
+
+    BLOCKSIZE = 1024 * 1024
+
+    def __init__(self, child_reader, queue_depth=DEFAULT_QUEUE_DEPTH,
+                 binary=False):
+        if queue_depth < 1:
+            raise ValueError("queue_depth must be at least 1")
+        self.child_reader = child_reader
+        self.queue = queue.Queue(maxsize=queue_depth)
+        self.stopping = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._produce,
+                                       name="wandio-reader")
+        self.thread.daemon = True
+        self.thread.start()
+        super(ThreadedReader, self).__init__(child_reader, binary=binary)
+
+    def _produce(self):
+        try:
+            while not self.stopping.is_set():
+                block = self.child_reader.read(self.BLOCKSIZE)
+                self.queue.put(block)
+                if not len(block):
+                    return
+        except BaseException as e:
+            # hand the exception over to the consumer to be re-raised
+            self.queue.put(e)
+
+    def _read_block(self):
+        if self.error is not None:
+            raise self.error
+        if self.io_stats is None:
+            block = self.queue.get()
+        else:
+            # time spent waiting for the background thread
+            block = wandio.stats.timed(self.io_stats, "queue_wait",
+                                       self.queue.get)
+        if isinstance(block, BaseException):
+            self.error = block
+            raise block
+        return block
+
+    def close(self):
+        if self.thread.is_alive():
+            self.stopping.set()
+            # the producer may be blocked on a full queue, so make room for
+            # the one block it can still put before it notices we're stopping
+            try:
+                while True:
+                    self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.thread.join()
+        self.child_reader.close()
@@ -0,0 +1,272 @@
+import fnmatch
+import io
+import os
+import re
+import stat
+from urllib.parse import urlsplit
+
+import wandio.file
+import wandio.plugins
+
+
+class Transport(object):
+    """
+    Describes a way of getting at files: the URL schemes it handles, and
+    factories for its readers and writers. Readers are created as
+    reader(filename, mode, options, **kwargs), where kwargs are the
+    connections, range_size and max_buffer options passed to Reader
+    (factories should ignore options they don't use) and byte_range, a
+    (start, end) tuple that readers of seekable files must honor by
+    returning the file's data from offset start (end, which may be None, is
+    where reading will probably stop, but data after it may be read too).
+    Writers are created as writer(filename, mode, options, binary,
+    **kwargs), where kwargs may contain atomic=True, asking for a writer
+    whose data only becomes visible once it has been written completely:
+    such writers have prepare (finish writing the data), commit (make it
+    visible) and abort methods. stat(filename, options) returns a dict with
+    (at least) the file's mtime and size.
+    listdir(url, options, details) and glob(pattern, options, details) are
+    generators of dicts with the "name" (the full path or URL), "size",
+    "mtime" and "is_dir" of each entry, where size and mtime may be left as
+    None unless details is set. Transports that can list directories but
+    don't provide glob get a glob that is built on listdir.
+    Factories should import the modules that implement the transport
+    themselves, so that they are only imported once the transport is used.
+    """
+
+    def __init__(self, name, schemes, reader, writer=None, stat=None,
+                 remote=True, listdir=None, glob=None):
+        """
+        :param remote: whether files are fetched from elsewhere (and so
+        may be cached locally)
+        """
+        self.name = name
+        self.schemes = tuple(schemes)
+        self._reader = reader
+        self._writer = writer
+        self._stat = stat
+        self._listdir = listdir
+        self._glob = glob
+        self.remote = remote
+
+    def __repr__(self):
+        return "Transport(%r)" % self.name
+
+    def reader(self, filename, mode="r", options=None, **kwargs):
+        return self._reader(filename, mode, options, **kwargs)
+
+    def writer(self, filename, mode="w", options=None, binary=False,
+               **kwargs):
+        if self._writer is None:
+            raise NotImplementedError("Writing to %s is not supported" %
+                                      self.name)
+        return self._writer(filename, mode, options, binary, **kwargs)
+
+    def stat(self, filename, options=None):
+        if self._stat is None:
+            raise NotImplementedError("Stat is not supported for %s files" %
+                                      self.name)
+        return self._stat(filename, options)
+
+    def listdir(self, url, options=None, details=False):
+        if self._listdir is None:
+            raise NotImplementedError("Listing is not supported for %s" %
+                                      self.name)
+        return self._listdir(url, options, details)
+
+    def glob(self, pattern, options=None, details=False):
+        if self._glob is not None:
+            return self._glob(pattern, options, details)
+        return _listdir_glob(self, pattern, options, details)
+
+
+_transports = []
+_plugins_loaded = False
+
+
+def register(transport):
+    """
+    Register a transport. Transports registered later take precedence over
+    those registered earlier, so this can also be used to replace a
+    built-in transport
+    :param transport: Transport instance
+    """
+    _transports.insert(0, transport)
+
+
+def transports():
+    return list(_transports)
+
+
+def get_scheme(filename):
+    """
+    Get the URL scheme of the given file name ("file" for local paths, and
+    "stdin" for "-")
+    """
+    if filename == "-":
+        return "stdin"
+    parts = urlsplit(filename)
+    if parts.netloc:
+        return parts.scheme
+    return "file"
+
+
+def _find_by_scheme(scheme):
+    for transport in _transports:
+        if scheme in transport.schemes:
+            return transport
+    return None
+
+
+def find(filename):
+    """
+    Get the transport for the given file name or URL
+    """
+    global _plugins_loaded
+    scheme = get_scheme(filename)
+    transport = _find_by_scheme(scheme)
+    if transport is None and not _plugins_loaded:
+        _plugins_loaded = True
+        # plugins don't take precedence over transports registered in code
+        _transports.extend(wandio.plugins.load(wandio.plugins.TRANSPORT_GROUP))
+        transport = _find_by_scheme(scheme)
+    if transport is None:
+        raise ValueError("Unsupported URL scheme '%s' in '%s'" %
+                         (scheme, filename))
+    return transport
+
+
+# characters that make a path a glob pattern
+_GLOB_MAGIC_RE = re.compile("[*?[]")
+
+
+def _listdir_glob(transport, pattern, options, details):
+    match = _GLOB_MAGIC_RE.search(pattern)
+    if match is None:
+        # no wildcards, so the pattern only matches the path itself
+        try:
+            info = transport.stat(pattern, options)
+        except (IOError, OSError):
+            return
+        yield {"name": pattern, "size": info.get("size"),
+               "mtime": info.get("mtime"), "is_dir": False}
+        return
+    base = pattern[:match.start()].rpartition("/")[0]
+    (segment, _, rest) = pattern[len(base) + 1:].partition("/")
+    for entry in transport.listdir(base, options, details and not rest):
+        name = entry["name"].rpartition("/")[2]
+        # like glob.glob, wildcards don't match a leading "."
+        if not fnmatch.fnmatchcase(name, segment) or \
+                (name.startswith(".") and not segment.startswith(".")):
+            continue
+        if not rest:
+            yield entry
+        elif entry["is_dir"]:
+            for match in _listdir_glob(transport, entry["name"] + "/" + rest,
+                                       options, details):
+                yield match
+
+
+def _file_entry(path, details):
+    info = os.stat(path)
+    return {
+        "name": path,
+        "size": info.st_size if details else None,
+        "mtime": info.st_mtime if details else None,
+        "is_dir": stat.S_ISDIR(info.st_mode),
+    }
+
+
+def _file_reader(filename, mode, options, byte_range=None, **kwargs):
+    # regular files are memory mapped when they're read as bytes
+    if mode == "rb" and wandio.file.MmapReader.can_map(filename):
+        fh = wandio.file.MmapReader(filename, mode=mode)
+    else:
+        fh = wandio.file.SimpleReader(filename, mode=mode)
+    if byte_range is not None:
+        fh.seek(byte_range[0])
+    return fh
+
+
+def _file_writer(filename, mode, options, binary, atomic=False, **kwargs):
+    if atomic:
+        return wandio.file.AtomicFileWriter(filename,
+                                            mode="wb" if binary else mode)
+    return wandio.file.SimpleWriter(filename, mode="wb" if binary else mode)
+
+
+def _file_stat(filename, options):
+    return wandio.file.file_stat(filename)
+
+
+def _file_listdir(path, options, details):
+    for name in sorted(os.listdir(path)):
+        yield _file_entry(os.path.join(path, name), details)
+
+
+def _file_glob(pattern, options, details):
+    import glob
+    for path in glob.iglob(pattern):
+        yield _file_entry(path, details)
+
+
+def _stdin_reader(filename, mode, options, byte_range=None, **kwargs):
+    if byte_range is not None:
+        raise io.UnsupportedOperation("Cannot read a byte range from STDIN")
+    return wandio.file.StdinReader(mode=mode)
+
+
+def _stdin_stat(filename, options):
+    raise NotImplementedError("Cannot perform stat operation on STDIN")
+
+
+def _http_reader(filename, mode, options, **kwargs):
+    import wandio.wand_http
+    return wandio.wand_http.HttpReader(filename, options=options, **kwargs)
+
+
+def _http_stat(filename, options):
+    import wandio.wand_http
+    return wandio.wand_http.http_stat(filename, options=options)
+
+
+def _http_listdir(url, options, details):
+    import wandio.wand_http
+    return wandio.wand_http.http_listdir(url, options=options)
+
+
+def _swift_reader(filename, mode, options, **kwargs):
+    import wandio.swift
+    return wandio.swift.SwiftReader(filename, options=options, **kwargs)
+
+
+def _swift_writer(filename, mode, options, binary, **kwargs):
+    # (Swift objects only become visible once they're complete anyway)
+    import wandio.swift
+    return wandio.swift.SwiftWriter(filename, options=options,
+                                    use_bytes_io=binary)
+
+
+def _swift_stat(filename, options):
+    import wandio.swift
+    return wandio.swift.object_stat(filename, options=options)
+
+
+def _swift_listdir(url, options, details):
+    import wandio.swift
+    return wandio.swift.listdir(url, options=options)
+
+
+def _swift_glob(pattern, options, details):
+    import wandio.swift
+    return wandio.swift.glob(pattern, options=options)
+
+
+register(Transport("file", ["file"], _file_reader, _file_writer, _file_stat,
+                   remote=False, listdir=_file_listdir, glob=_file_glob))
+register(Transport("stdin", ["stdin"], _stdin_reader, stat=_stdin_stat,
+                   remote=False))
+register(Transport("HTTP", ["http", "https"], _http_reader, stat=_http_stat,
+                   listdir=_http_listdir))
+register(Transport("swift", ["swift"], _swift_reader, _swift_writer,
+                   _swift_stat, listdir=_swift_listdir, glob=_swift_glob))
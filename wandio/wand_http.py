@@ -1,21 +1,263 @@
+import io
+import os
+import socket
 import sys
+import threading
+import time
 
 import email
+import http.client as httplib
+from html.parser import HTMLParser
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit
+from urllib.request import urlopen, Request, getproxies, proxy_bypass
+
 import wandio.file
 
-# urllib import compatible with both python2 and python3
-# https://python-future.org/compatible_idioms.html#urllib-module
-try:
-    from urllib.request import urlopen, Request
-except ImportError:
-    from urllib2 import urlopen, Request
+DEFAULT_MAX_CONNECTIONS = 10
+DEFAULT_IDLE_TIMEOUT = 30
+MAX_REDIRECTS = 10
+REDIRECT_CODES = [301, 302, 303, 307, 308]
+USER_AGENT = "pywandio"
+
+
+class PooledResponse(object):
+    """
+    Wraps an HTTP response so that its connection is returned to the pool
+    once the body has been read completely, and keeps track of how much of
+    the body has been read (conn is None for responses that aren't pooled)
+    """
+
+    def __init__(self, pool, key, conn, response):
+        self.pool = pool
+        self.key = key
+        self.conn = conn
+        self.response = response
+        # number of bytes of the body read so far
+        self.pos = 0
+        self._check_done()
+
+    def _check_done(self):
+        if self.conn is None:
+            return
+        # readline doesn't notice that the body is complete when the last
+        # line is read, so check the remaining length too
+        if self.response.length == 0:
+            self.response.close()
+        if self.response.isclosed():
+            self.pool._release(self.key, self.conn,
+                               not self.response.will_close)
+            self.conn = None
+
+    def read(self, *args):
+        data = self.response.read(*args)
+        self.pos += len(data)
+        self._check_done()
+        return data
+
+    def readinto(self, b):
+        n = self.response.readinto(b)
+        self.pos += n
+        self._check_done()
+        return n
+
+    def readline(self, *args):
+        line = self.response.readline(*args)
+        self.pos += len(line)
+        self._check_done()
+        return line
+
+    def tell(self):
+        return self.pos
+
+    def peek(self, *args):
+        return self.response.peek(*args)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def getcode(self):
+        return self.response.status
+
+    def info(self):
+        return self.response.msg
+
+    def close(self):
+        if self.conn is not None:
+            # the body hasn't been read completely, so the connection can't
+            # be used for another request
+            self.conn.close()
+            self.conn = None
+        self.response.close()
+
+
+class HttpConnectionPool(object):
+    """
+    Thread-safe pool of keep-alive HTTP(S) connections, keyed by scheme,
+    host and port. At most max_connections idle connections are kept for
+    each host, and connections that have been idle for longer than
+    idle_timeout seconds are discarded.
+    """
+
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, timeout=None):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        # key -> list of (connection, time it was last used)
+        self.idle = {}
+
+    def _connect(self, key):
+        (scheme, host, port) = key
+        if scheme == "https":
+            return httplib.HTTPSConnection(host, port, timeout=self.timeout)
+        return httplib.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _get(self, key):
+        with self.lock:
+            conns = self.idle.get(key, [])
+            while conns:
+                (conn, last_used) = conns.pop()
+                if time.time() - last_used < self.idle_timeout:
+                    return conn, True
+                conn.close()
+        return self._connect(key), False
+
+    def _release(self, key, conn, reusable):
+        if reusable:
+            with self.lock:
+                conns = self.idle.setdefault(key, [])
+                if len(conns) < self.max_connections:
+                    conns.append((conn, time.time()))
+                    return
+        conn.close()
+
+    def _send(self, key, method, path, headers, body):
+        (conn, reused) = self._get(key)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            return conn, conn.getresponse()
+        except (httplib.HTTPException, socket.error):
+            conn.close()
+            if not reused:
+                raise
+        # the server probably closed the idle connection, so try again with
+        # a new one
+        conn = self._connect(key)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            return conn, conn.getresponse()
+        except BaseException:
+            conn.close()
+            raise
+
+    def request(self, method, url, headers=None, body=None):
+        """
+        Make a request, following redirects, and return a file-like
+        response (or raise HTTPError for error responses)
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            if _use_proxy(parts):
+                # leave proxied requests to urllib
+                request = Request(url, data=body, headers=headers or {})
+                request.get_method = lambda: method
+                return PooledResponse(self, None, None, urlopen(request))
+            hdrs = {"User-Agent": USER_AGENT}
+            hdrs.update(headers or {})
+            key = (parts.scheme, parts.hostname, parts.port)
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            (conn, response) = self._send(key, method, path, hdrs, body)
+            res = PooledResponse(self, key, conn, response)
+            if method == "HEAD":
+                res.read()
+            if response.status < 300:
+                return res
+            # read the (usually small) body so that the connection can be
+            # reused
+            res.read()
+            res.close()
+            location = response.msg.get("Location")
+            if response.status in REDIRECT_CODES and location:
+                url = urljoin(url, location)
+                if response.status == 303:
+                    (method, body) = ("GET", None)
+                continue
+            raise HTTPError(url, response.status, response.reason,
+                            response.msg, None)
+        raise HTTPError(url, response.status, "Too many redirects",
+                        response.msg, None)
+
+    def close(self):
+        with self.lock:
+            for conns in self.idle.values():
+                for (conn, _) in conns:
+                    conn.close()
+            self.idle = {}
+
 
+def _use_proxy(parts):
+    proxies = getproxies()
+    return parts.scheme in proxies and not proxy_bypass(parts.hostname)
 
-def http_stat(filename):
-    request = Request(filename)
-    request.get_method = lambda: 'HEAD'
-    response = urlopen(request)
-    hdrs = response.info()
+
+_default_pool = None
+_default_pool_pid = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    """
+    Get the process-wide connection pool (a new pool is created after a
+    fork, since connections can't be shared between processes)
+    """
+    global _default_pool, _default_pool_pid
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool_pid != os.getpid():
+            _default_pool = HttpConnectionPool()
+            _default_pool_pid = os.getpid()
+        return _default_pool
+
+
+def set_default_pool(pool):
+    """
+    Replace the process-wide connection pool (e.g. with one that has
+    different limits)
+    """
+    global _default_pool, _default_pool_pid
+    with _default_pool_lock:
+        _default_pool = pool
+        _default_pool_pid = os.getpid()
+
+
+def get_pool(options=None):
+    """
+    Get the connection pool given in options (as "http_pool"), or the
+    process-wide pool
+    """
+    if options is not None and options.get("http_pool") is not None:
+        return options["http_pool"]
+    return get_default_pool()
+
+
+def http_head(url, options=None):
+    """
+    Get the headers for the given URL using a HEAD request
+    """
+    return get_pool(options).request("HEAD", url).info()
+
+
+def http_stat(filename, options=None):
+    hdrs = http_head(filename, options=options)
 
     # Last Modified time
     mtime = None
@@ -32,14 +274,164 @@ def http_stat(filename):
     return {
         "mtime": mtime,
         "size": size,
+        "etag": hdrs.get("ETag"),
     }
 
 
-class HttpReader(wandio.file.GenericReader):
+class _LinkParser(HTMLParser):
+    # collects the targets of the <a href="..."> links in a page
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            for (name, value) in attrs:
+                if name == "href" and value:
+                    self.links.append(value)
 
-    def __init__(self, url):
+
+def http_listdir(url, options=None):
+    """
+    List the files and directories in an HTTP directory index (such as the
+    pages that Apache and nginx generate), by following the links in the
+    page that point below the given URL. Sizes and modification times
+    aren't reliably given by index pages, so they are left as None.
+    :return: generator of dictionaries with the "name" (URL), "size",
+    "mtime" and "is_dir" of each entry
+    """
+    if not url.endswith("/"):
+        url += "/"
+    res = get_pool(options).request("GET", url)
+    try:
+        body = res.read()
+    finally:
+        res.close()
+    charset = res.info().get_content_charset() \
+        if hasattr(res.info(), "get_content_charset") else None
+    parser = _LinkParser()
+    parser.feed(body.decode(charset or "utf-8", "replace"))
+    parser.close()
+    seen = set()
+    for link in parser.links:
+        link = urljoin(url, link).split("#")[0]
+        # skip sorting links ("?C=N;O=D"), the parent directory and links
+        # to other sites or deeper directories
+        if "?" in link or not link.startswith(url) or link == url:
+            continue
+        name = link[len(url):]
+        if "/" in name.rstrip("/") or link in seen:
+            continue
+        seen.add(link)
+        yield {
+            "name": link.rstrip("/"),
+            "size": None,
+            "mtime": None,
+            "is_dir": link.endswith("/"),
+        }
+
+
+class HttpRangeReader(wandio.file.RangeReader):
+    """
+    Downloads byte ranges of an HTTP file over several connections at once
+    """
+
+    def __init__(self, url, size, connections, pool, **kwargs):
         self.url = url
-        super(HttpReader, self).__init__(urlopen(self.url))
+        self.http_pool = pool
+        super(HttpRangeReader, self).__init__(size, connections, **kwargs)
+
+    def _fetch_range(self, start, end):
+        response = self.http_pool.request(
+            "GET", self.url,
+            headers={"Range": "bytes=%d-%d" % (start, end - 1)})
+        try:
+            if response.getcode() != 206:
+                raise IOError("Server did not honor range request for %s" %
+                              self.url)
+            return response.read()
+        finally:
+            response.close()
+
+
+class HttpReader(wandio.file.TransportReader):
+
+    def __init__(self, url, options=None, connections=1, byte_range=None,
+                 **kwargs):
+        """
+        :param url: URL to read
+        :param options: may contain an "http_pool" connection pool to use
+        :param connections: number of connections to download the file
+        over, if the server supports range requests
+        :param byte_range: (start, end) tuple: read from offset start, on
+        the assumption that reading will stop at about end (or None)
+        :param kwargs: range_size and max_buffer options for HttpRangeReader
+        """
+        self.url = url
+        self.http_pool = get_pool(options)
+        self.open_time = time.time()
+        self.first_byte_time = None
+        (start, end) = byte_range or (0, None)
+        # offset in the file of the start of the current response
+        self.offset = start
+        fh = None
+        if connections > 1:
+            hdrs = self.http_pool.request("HEAD", url).info()
+            accept_ranges = hdrs.get("Accept-Ranges", "")
+            if "Content-Length" in hdrs and "bytes" in accept_ranges:
+                fh = HttpRangeReader(url, int(hdrs["Content-Length"]),
+                                     connections, self.http_pool, limit=end,
+                                     **kwargs)
+                if start:
+                    fh.seek(start)
+        if fh is None:
+            # fall back to a single stream
+            fh = self._get(start)
+            self.first_byte_time = time.time()
+        super(HttpReader, self).__init__(fh)
+
+    def _get(self, offset):
+        # request the file starting from the given offset
+        if not offset:
+            return self.http_pool.request("GET", self.url)
+        response = self.http_pool.request("GET", self.url,
+                                     headers={"Range": "bytes=%d-" % offset})
+        if response.getcode() != 206:
+            response.close()
+            raise io.UnsupportedOperation("server does not support range "
+                                          "requests")
+        return response
+
+    @property
+    def ttfb(self):
+        """
+        Seconds from opening the file until the first data (the response
+        headers, or the first range) was received, or None if that hasn't
+        happened yet
+        """
+        return wandio.file.time_to_first_byte(self)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if isinstance(self.fh, HttpRangeReader):
+            return self.fh.seek(offset, whence)
+        # re-request the file starting from the given offset
+        if whence == io.SEEK_CUR:
+            offset += self.tell()
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("can only seek relative to the "
+                                          "start of an HTTP file or the "
+                                          "current position")
+        response = self._get(offset)
+        self.fh.close()
+        self.offset = offset
+        self.fh = response
+        return offset
+
+    def tell(self):
+        if isinstance(self.fh, HttpRangeReader):
+            return self.fh.tell()
+        return self.offset + self.fh.tell()
 
     def __next__(self):
-        return next(self.fh).decode("utf-8")
+        return self._count(next(self.fh)).decode("utf-8")